@@ -4,43 +4,113 @@ from flask_cors import CORS
 from routes.auth import auth_bp, admin_bp
 from routes.bus_routes import bus_bp
 from routes.schedule_routes import schedule_bp 
-from db import db
+from routes.ops_routes import ops_bp
+from routes.sync_routes import sync_bp
+from routes.booking_routes import booking_bp
+from routes.gtfs_routes import gtfs_bp
+from models.sync_model import SyncModel
+from models.bus_model import BusModel
+from models.booking_model import BookingModel
+from models.stats_model import StatsModel, stats_reconciler
+from db import db, reset_client
 from utils.custom_json_encoder import CustomJSONEncoder
+from utils.profiler import init_profiler, profile_store
+from utils.compression import init_compression, compressed_cache
+from utils.cache import read_cache
+from utils.timetable_snapshot import timetable, compile_snapshot
+from utils.fleet_monitor import fleet_monitor
 
-# --- App Initialization ---
-app = Flask(__name__)
 
-# Load secret key from config or environment
-app.config["SECRET_KEY"] = "SECRET_KEY" # Replace with your actual secret key management
+# --- App Factory ---
+def create_app():
+    """Builds a configured Flask app. Does not touch the database."""
+    app = Flask(__name__)
 
-# Improve CORS setup for production readiness
-CORS(app, resources={r"/*": {"origins": "*"}}) # Allows all origins for development
+    # Load secret key from config or environment
+    app.config["SECRET_KEY"] = "SECRET_KEY" # Replace with your actual secret key management
 
-# Set custom JSON encoder globally - This automatically handles ObjectId and datetime conversion for all jsonify responses
-app.json_encoder = CustomJSONEncoder
+    # Improve CORS setup for production readiness
+    CORS(app, resources={r"/*": {"origins": "*"}}) # Allows all origins for development
 
-# --- Register Blueprints ---
-app.register_blueprint(auth_bp, url_prefix="/auth")
-app.register_blueprint(admin_bp, url_prefix="/admin")
-app.register_blueprint(bus_bp, url_prefix="/buses")
-app.register_blueprint(schedule_bp, url_prefix="/schedules")
+    # Set custom JSON encoder globally - This automatically handles ObjectId and datetime conversion for all jsonify responses
+    app.json_encoder = CustomJSONEncoder
 
-# --- Base Routes ---
-@app.route("/", methods=["GET"])
-def health_check():
-    return {"status": "OK", "message": "MyBus API is running 🚍"}, 200
+    # Opt-in request profiling (admin X-Profile header or PROFILE_SAMPLE_RATE)
+    init_profiler(app)
+
+    # gzip/brotli for large JSON responses, with cached bodies for hot GETs
+    init_compression(app)
+
+    # --- Register Blueprints ---
+    app.register_blueprint(auth_bp, url_prefix="/auth")
+    app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(bus_bp, url_prefix="/buses")
+    app.register_blueprint(schedule_bp, url_prefix="/schedules")
+    app.register_blueprint(ops_bp, url_prefix="/admin")
+    app.register_blueprint(sync_bp, url_prefix="/sync")
+    app.register_blueprint(booking_bp, url_prefix="/bookings")
+    app.register_blueprint(gtfs_bp, url_prefix="/gtfs")
+
+    # --- Base Routes ---
+    @app.route("/", methods=["GET"])
+    def health_check():
+        return {"status": "OK", "message": "MyBus API is running 🚍", "pid": os.getpid()}, 200
+
+    @app.route("/db-check", methods=["GET"])
+    def db_check():
+        try:
+            # Pymongo's command 'ping' is a lightweight way to check connection
+            db.command('ping')
+            return {"status": "OK", "message": "MongoDB connected successfully"}, 200
+        except Exception as e:
+            return {"status": "FAIL", "error": str(e)}, 500
+
+    return app
+
+
+# --- Process Lifecycle ---
+def ensure_indexes():
+    """Creates indexes and runs one-off backfills. Run once per deploy, before forking workers."""
+    SyncModel.ensure_indexes()
+    profile_store.ensure_collection()
+    BusModel.backfill_route_geometry()
+    BookingModel.ensure_indexes()
+    StatsModel.reconcile()  # Builds the dashboard counters on first deploy, fixes drift after
+
+
+def compile_timetable():
+    """Builds the shared timetable snapshot workers mmap (when TIMETABLE_DIR is set)."""
+    if timetable.enabled:
+        compile_snapshot()
+
+
+def init_worker():
+    """Per-process state reset, run in each worker right after fork."""
+    reset_client()
+    compressed_cache.clear()
+    read_cache.reset()
+    timetable.reset()
+
+
+def warm_up():
+    """Opens the worker's Mongo pool and primes in-process caches before it accepts traffic."""
+    db.command('ping')
+    timetable.get()
+    stats_reconciler.start()
+    fleet_monitor.start()
 
-@app.route("/db-check", methods=["GET"])
-def db_check():
-    try:
-        # Pymongo's command 'ping' is a lightweight way to check connection
-        db.command('ping')
-        return {"status": "OK", "message": "MongoDB connected successfully"}, 200
-    except Exception as e:
-        return {"status": "FAIL", "error": str(e)}, 500
 
 # --- Run the App ---
 if __name__ == "__main__":
+    # Development server; see gunicorn.conf.py for the multi-worker production mode
+    app = create_app()
+    try:
+        ensure_indexes()
+        compile_timetable()
+        stats_reconciler.start()
+        fleet_monitor.start()
+    except Exception as e:
+        print(f"❌ Startup tasks failed: {e}")
     # Debug mode is based on environment variable for safety
     is_debug = os.getenv("FLASK_DEBUG", "1") == "1"
-    app.run(host="0.0.0.0", port=5000, debug=is_debug)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, debug=is_debug)
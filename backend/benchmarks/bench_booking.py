@@ -0,0 +1,146 @@
+"""
+Concurrency check for the seat reservation engine.
+
+Hundreds of simultaneous bookers race for seats on one trip, each holding a
+random stop segment and then confirming or releasing it. Afterwards the trip's
+per-segment counters are compared with the holds actually stored: the run
+fails (exit code 1) if any segment is overbooked or the counters drifted.
+Hold/confirm latency percentiles are printed as JSON.
+
+    python -m benchmarks.bench_booking --mongo-uri mongodb://localhost:27017 --bookers 500
+
+Needs a real MongoDB: the mongomock stand-in does not make single operations
+atomic across threads, so it cannot demonstrate the absence of overbooking.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentiles(values):
+    from benchmarks.run_benchmark import percentile
+    values = sorted(values)
+    if not values:
+        return None
+    return {f"p{p}": round(percentile(values, p), 3) for p in (50, 95, 99)} | {"max": round(values[-1], 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seat reservation concurrency benchmark")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="mybus_bench")
+    parser.add_argument("--bookers", type=int, default=300, help="Simultaneous bookers")
+    parser.add_argument("--capacity", type=int, default=40)
+    parser.add_argument("--stops", type=int, default=12)
+    parser.add_argument("--max-seats", type=int, default=3, help="Seats per hold, 1..N")
+    parser.add_argument("--confirm-rate", type=float, default=0.8, help="Share of holds that are confirmed")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = args.db_name
+    if args.mongo_uri.startswith("mongomock"):
+        print("⚠️  mongomock is not atomic across threads; results are not meaningful", file=sys.stderr)
+
+    from db import db
+    from models.bus_model import BusModel
+    from models.schedule_model import ScheduleModel
+    from models.booking_model import BookingModel, BookingError, WEEKDAYS
+
+    for name in ("trip_occupancy", "seat_holds"):
+        db[name].drop()
+    BookingModel.ensure_indexes()
+
+    stops = [{"name": f"Stop {i}", "lat": 22.5 + i * 0.005, "lng": 88.36, "order": i} for i in range(args.stops)]
+    bus = BusModel.create_bus("CITY", "BENCH-1", "AC", args.capacity, "BENCH", "BENCH",
+                              route={"name": "Bench", "city": "Kolkata", "stops": stops})
+    schedule = ScheduleModel.create_schedule(bus["_id"], WEEKDAYS, [{"stop_name": s["name"]} for s in stops])
+    service_date = time.strftime("%Y-%m-%d")
+
+    rng = random.Random(args.seed)
+    plans = []
+    for i in range(args.bookers):
+        a, b = sorted(rng.sample(range(args.stops), 2))
+        plans.append((f"{i + 1:024x}", a, b, rng.randint(1, args.max_seats), rng.random() < args.confirm_rate))
+
+    hold_ms, confirm_ms = [], []
+    outcomes = {"held": 0, "rejected": 0, "confirmed": 0, "released": 0, "errors": 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(args.bookers)
+
+    def book(plan):
+        user_id, a, b, seats, confirm = plan
+        start_gate.wait()  # release every booker at once
+        try:
+            started = time.perf_counter()
+            try:
+                hold = BookingModel.create_hold(user_id, schedule["_id"], service_date, a, b, seats)
+            except BookingError:
+                with lock:
+                    outcomes["rejected"] += 1
+                    hold_ms.append((time.perf_counter() - started) * 1000.0)
+                return
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                outcomes["held"] += 1
+                hold_ms.append(elapsed)
+
+            started = time.perf_counter()
+            if confirm:
+                BookingModel.confirm_hold(hold["_id"], user_id)
+                key = "confirmed"
+            else:
+                BookingModel.cancel(hold["_id"], user_id)
+                key = "released"
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                outcomes[key] += 1
+                confirm_ms.append(elapsed)
+        except Exception as e:
+            with lock:
+                outcomes["errors"] += 1
+            print(f"❌ booker {user_id}: {e}", file=sys.stderr)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.bookers) as pool:
+        list(pool.map(book, plans))
+    elapsed = time.perf_counter() - started
+
+    # --- Verify: stored holds vs. counters ---
+    trip = BookingModel.trips.find_one({"_id": BookingModel.trip_id(schedule["_id"], service_date)})
+    occupied = [0] * (args.stops - 1)
+    for hold in BookingModel.holds.find({"tripId": trip["_id"], "status": {"$in": ["HELD", "BOOKED"]}}):
+        for i in range(hold["fromIndex"], hold["toIndex"]):
+            occupied[i] += hold["seats"]
+    overbooked = [i for i, seats in enumerate(occupied) if seats > args.capacity]
+    drift = [i for i, seats in enumerate(occupied) if trip["free"][i] != args.capacity - seats]
+
+    report = {
+        "bookers": args.bookers,
+        "capacity": args.capacity,
+        "segments": args.stops - 1,
+        "elapsedSec": round(elapsed, 3),
+        "outcomes": outcomes,
+        "holdLatencyMs": percentiles(hold_ms),
+        "confirmLatencyMs": percentiles(confirm_ms),
+        "occupiedPerSegment": occupied,
+        "overbookedSegments": overbooked,
+        "counterDriftSegments": drift,
+        "ok": not overbooked and not drift and outcomes["errors"] == 0,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output)
+    print(output)
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
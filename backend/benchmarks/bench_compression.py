@@ -0,0 +1,90 @@
+"""
+Bandwidth and CPU numbers for response compression.
+
+For each cacheable payload (bus list, cities/stops catalog, schedules for one
+bus) this reports the uncompressed size, the gzip/brotli sizes, and the CPU
+time per request without compression, with compression on every hit (cache
+cleared), and with the compressed-body cache warm.
+
+    python -m benchmarks.bench_compression --buses 1000,10000
+"""
+import argparse
+import json
+import os
+import time
+
+ENDPOINTS = {
+    "buses_all": "/buses/?mode=all",
+    "buses_cities": "/buses/?mode=cities",
+    "buses_stops": "/buses/?mode=stops",
+    "schedules_by_bus": "/schedules/?busId={bus_id}",
+}
+
+
+def cpu_ms_per_request(client, path, headers, repeat, before_each=None):
+    started = time.process_time()
+    for _ in range(repeat):
+        if before_each:
+            before_each()
+        client.get(path, headers=headers)
+    return round((time.process_time() - started) * 1000.0 / repeat, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--buses", default="1000", help="Comma-separated fleet sizes")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per measurement")
+    parser.add_argument("--mongo-uri", default="mongomock://")
+    parser.add_argument("--db-name", default="mybus_bench")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = args.db_name
+
+    from app import create_app
+    from db import db
+    from benchmarks.seed import seed
+    from utils.compression import brotli, compressed_cache
+    from utils.jwt_utils import generate_token
+
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+    client = create_app().test_client()
+    auth = {"Authorization": f"Bearer {generate_token('000000000000000000000000', 'USER')}"}
+    results = []
+
+    for fleet_size in [int(n) for n in args.buses.split(",") if n.strip()]:
+        dataset = seed(db, fleet_size, args.users)
+        fleet = {"buses": fleet_size, "endpoints": {}}
+        for name, template in ENDPOINTS.items():
+            path = template.format(bus_id=dataset["bus_ids"][0])
+            identity = {**auth, "Accept-Encoding": "identity"}
+            raw = client.get(path, headers=identity).get_data()
+            entry = {
+                "rawBytes": len(raw),
+                "cpuMsIdentity": cpu_ms_per_request(client, path, identity, args.repeat),
+            }
+            for encoding in encodings:
+                headers = {**auth, "Accept-Encoding": encoding}
+                encoded = client.get(path, headers=headers).get_data()
+                entry[encoding] = {
+                    "bytes": len(encoded),
+                    "ratio": round(len(encoded) / len(raw), 4) if raw else None,
+                    "cpuMsUncached": cpu_ms_per_request(
+                        client, path, headers, args.repeat, before_each=compressed_cache.clear
+                    ),
+                    "cpuMsCached": cpu_ms_per_request(client, path, headers, args.repeat),
+                }
+            fleet["endpoints"][name] = entry
+        results.append(fleet)
+
+    output = json.dumps({"encodings": encodings, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+GTFS export/import benchmark.
+
+Seeds enough buses for roughly --stop-times rows in stop_times.txt (about 38
+per bus with the synthetic generator), streams the export into a file while
+tracking peak Python heap with tracemalloc (in total, and outside the
+database driver, whose mongomock stand-in buffers whole query results),
+then imports that file into a
+second, empty database. Prints one JSON document with rows, bytes, seconds,
+rows/s and peak heap for both directions, and checks the import round-trips
+the schedule and stop_time counts.
+
+    python -m benchmarks.bench_gtfs --stop-times 1000000 --mongo-uri mongodb://localhost:27017
+
+On the mongomock stand-in every upsert scans the collection, so import time
+grows quadratically there; use a real MongoDB for import numbers, or
+--no-import to measure the export alone.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+STOP_TIMES_PER_BUS = 38
+SNAPSHOT_EVERY = 25  # chunks between heap snapshots (plus the first chunk and the end of the export)
+# mongomock materialises whole query results; count only what the exporter itself holds
+DRIVER_FILTERS = [tracemalloc.Filter(False, f"*{name}*") for name in ("mongomock", "pymongo", "bson")]
+
+
+def exporter_heap():
+    """Current traced heap outside the database driver, in bytes."""
+    snapshot = tracemalloc.take_snapshot().filter_traces(DRIVER_FILTERS)
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GTFS export/import benchmark")
+    parser.add_argument("--stop-times", type=int, default=1000000, help="Approximate stop_times rows to export")
+    parser.add_argument("--mongo-uri", default="mongomock://")
+    parser.add_argument("--db-name", default="mybus_bench", help="Database to seed (it is dropped!)")
+    parser.add_argument("--import-db-name", default="mybus_bench_gtfs", help="Database to import into (it is dropped!)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--no-import", action="store_true", help="Only benchmark the export")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = args.db_name
+
+    from db import db
+    from benchmarks.seed import seed
+    from utils.gtfs import export_feed
+
+    buses = max(1, args.stop_times // STOP_TIMES_PER_BUS)
+    started = time.perf_counter()
+    seeded = seed(db, buses, 10)
+    seed_sec = time.perf_counter() - started
+
+    path = os.path.join(tempfile.mkdtemp(prefix="gtfs-bench-"), "feed.zip")
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = chunks = 0
+    samples = []
+    with open(path, "wb") as fh:
+        for chunk in export_feed(args.batch_size):
+            fh.write(chunk)
+            size += len(chunk)
+            chunks += 1
+            if chunks == 1 or chunks % SNAPSHOT_EVERY == 0:
+                samples.append(exporter_heap())
+        samples.append(exporter_heap())
+    export_sec = time.perf_counter() - started
+    _, export_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("stop_times.txt") as fh:
+            rows = sum(1 for _ in fh) - 1
+        members = {info.filename: info.file_size for info in archive.infolist()}
+
+    report = {
+        "mongoUri": args.mongo_uri,
+        "seed": {"buses": seeded["counts"]["buses"], "schedules": seeded["counts"]["schedules"], "seconds": round(seed_sec, 2)},
+        "export": {
+            "stopTimes": rows,
+            "zipBytes": size,
+            "chunks": chunks,
+            "members": members,
+            "seconds": round(export_sec, 2),
+            "stopTimesPerSec": round(rows / export_sec) if export_sec else None,
+            "peakHeapMb": round(export_peak / 1e6, 1),
+            "exporterHeapMb": round(max(samples) / 1e6, 1) if chunks else "not measured",
+        },
+    }
+    if not args.no_import:
+        report.update(run_import(args, path, rows, seeded["counts"]["schedules"]))
+    os.remove(path)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output)
+    print(output)
+    sys.exit(0 if report.get("roundTrip", True) else 1)
+
+
+def run_import(args, path, rows, schedules):
+    from config import Config
+    from db import get_client, reset_client
+    from utils.gtfs import import_feed
+
+    # Import into an empty database on the same server
+    get_client().drop_database(args.import_db_name)
+    Config.MONGO_DB_NAME = args.import_db_name
+    reset_client(close=True)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(path, "rb") as fh:
+        counts = import_feed(fh)
+    import_sec = time.perf_counter() - started
+    _, import_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "import": {
+            **counts,
+            "seconds": round(import_sec, 2),
+            "stopTimesPerSec": round(counts["stopTimes"] / import_sec) if import_sec else None,
+            "peakHeapMb": round(import_peak / 1e6, 1),
+        },
+        "roundTrip": counts["stopTimes"] == rows and counts["trips"] == schedules,
+    }
+
+
+if __name__ == "__main__":
+    main()
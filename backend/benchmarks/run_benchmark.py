@@ -0,0 +1,335 @@
+"""
+Load and benchmark driver for the MyBus API.
+
+Seeds a database with a synthetic fleet, then drives the Flask app at a fixed
+concurrency across the main endpoints and prints one JSON document with
+throughput, latency percentiles and the serving process's peak RSS per
+scenario (VmHWM, reset before each scenario on Linux).
+
+Run from the backend directory:
+
+    python -m benchmarks.run_benchmark --buses 100,1000,10000 --concurrency 16
+
+By default the in-memory stand-in (`mongomock://`, needs `pip install mongomock`)
+is used so runs are reproducible without a server. Pass `--mongo-uri` to
+benchmark against a real MongoDB; data goes to `--db-name` (default
+`mybus_bench`), which is dropped and reseeded for every fleet size.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = [
+    "buses_all",
+    "buses_cities",
+    "buses_stops",
+    "buses_search",
+    "bus_by_id",
+    "schedules_by_bus",
+    "auth_login",
+    "bus_update",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MyBus API load benchmark")
+    parser.add_argument("--buses", default="100,1000",
+                        help="Comma-separated fleet sizes to benchmark (e.g. 100,1000,100000)")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users to seed")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--mongo-uri", default="mongomock://",
+                        help="MongoDB URI, or mongomock:// for the in-memory stand-in")
+    parser.add_argument("--db-name", default="mybus_bench", help="Database to seed (it is dropped!)")
+    parser.add_argument("--base-url", default=None,
+                        help="Benchmark a running server over HTTP instead of the in-process app")
+    parser.add_argument("--accept-encoding", default=None,
+                        help="Accept-Encoding header to send (e.g. 'gzip, br')")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for data and request mix")
+    parser.add_argument("--server-pid", type=int, default=None,
+                        help="With --base-url: pid of the server process whose peak RSS to report "
+                             "(a single worker, e.g. gunicorn -w 1)")
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+def driver_max_rss_kb():
+    """Lifetime peak resident set size of this (driver) process in KiB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def reset_peak_rss(pid):
+    """
+    Resets the VmHWM (peak RSS) of a process so the next reading covers one
+    scenario only. Linux only, and only for processes we may write to;
+    returns False when the peak cannot be reset.
+    """
+    if pid is None:
+        return False
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def server_peak_rss_kb(pid):
+    """VmHWM of the process serving the requests in KiB, or None when unavailable."""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# --- Clients ---
+class InProcessClient:
+    """Drives the Flask app through its test client (one per thread)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, len(response.get_data())
+
+
+class HttpClient:
+    """Drives an already running server over plain HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, headers, body=None):
+        import urllib.request
+        import urllib.error
+
+        data = None
+        headers = dict(headers)
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, len(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+
+# --- Scenarios ---
+def build_request_factory(name, dataset, user_token, admin_token, rng_lock, rng):
+    """Returns a callable producing (method, path, headers, body) for a scenario."""
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    def pick(seq):
+        with rng_lock:
+            return rng.choice(seq)
+
+    if name == "buses_all":
+        return lambda: ("GET", "/buses/?mode=all", user_headers, None)
+    if name == "buses_cities":
+        return lambda: ("GET", "/buses/?mode=cities", user_headers, None)
+    if name == "buses_stops":
+        return lambda: ("GET", "/buses/?mode=stops", user_headers, None)
+    if name == "buses_search":
+        def search():
+            source, destination = pick(dataset["search_pairs"])
+            from urllib.parse import urlencode
+            query = urlencode({"mode": "search", "source": source, "destination": destination})
+            return "GET", f"/buses/?{query}", user_headers, None
+        return search
+    if name == "bus_by_id":
+        return lambda: ("GET", f"/buses/{pick(dataset['bus_ids'])}", user_headers, None)
+    if name == "schedules_by_bus":
+        return lambda: ("GET", f"/schedules/?busId={pick(dataset['bus_ids'])}", user_headers, None)
+    if name == "auth_login":
+        from benchmarks.seed import BENCH_PASSWORD
+        return lambda: ("POST", "/auth/login", {},
+                        {"email": pick(dataset["user_emails"]), "password": BENCH_PASSWORD})
+    if name == "bus_update":
+        def update():
+            with rng_lock:
+                location = {"lat": round(rng.uniform(12.0, 29.0), 6),
+                            "lng": round(rng.uniform(72.0, 89.0), 6)}
+            return "PUT", f"/buses/{pick(dataset['bus_ids'])}", admin_headers, {"currentLocation": location}
+        return update
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def run_scenario(client, make_request, total, warmup, concurrency, extra_headers, server_pid=None):
+    for _ in range(warmup):
+        method, path, headers, body = make_request()
+        client.request(method, path, {**headers, **extra_headers}, body)
+    # Measure the server's peak over this scenario alone, not its lifetime high-water mark
+    peak_is_scenario = reset_peak_rss(server_pid)
+
+    latencies = []
+    statuses = {}
+    bytes_out = 0
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        nonlocal bytes_out
+        local_latencies = []
+        local_statuses = {}
+        local_bytes = 0
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            method, path, headers, body = make_request()
+            started = time.perf_counter()
+            status, size = client.request(method, path, {**headers, **extra_headers}, body)
+            local_latencies.append((time.perf_counter() - started) * 1000.0)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            local_bytes += size
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+            bytes_out += local_bytes
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "elapsedSec": round(elapsed, 4),
+        "throughputRps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latencyMs": {
+            "p50": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95": round(percentile(latencies, 95), 3) if latencies else None,
+            "p99": round(percentile(latencies, 99), 3) if latencies else None,
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+        "avgResponseBytes": round(bytes_out / len(latencies), 1) if latencies else None,
+        "serverPeakRssKb": server_peak_rss_kb(server_pid),
+        "serverPeakRssScope": "scenario" if peak_is_scenario else ("lifetime" if server_pid else None),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.users < 1:
+        raise SystemExit("--users must be at least 1 (an admin user is always seeded)")
+
+    # The app reads its database settings at import time
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB_NAME"] = args.db_name
+
+    from db import db
+    from utils.jwt_utils import generate_token
+    from benchmarks.seed import seed
+
+    if args.base_url:
+        client = HttpClient(args.base_url)
+        server_pid = args.server_pid
+    else:
+        server_pid = os.getpid()  # the app runs inside this process
+        from app import create_app
+        client = InProcessClient(create_app())
+
+    extra_headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    results = []
+
+    for fleet_size in [int(n) for n in args.buses.split(",") if n.strip()]:
+        seed_started = time.perf_counter()
+        dataset = seed(db, fleet_size, args.users, seed_value=args.seed)
+        seed_elapsed = time.perf_counter() - seed_started
+
+        user_token = generate_token("000000000000000000000000", "USER")
+        admin_token = generate_token(dataset["admin_id"], "ADMIN")
+        rng = random.Random(args.seed)
+        rng_lock = threading.Lock()
+
+        fleet_result = {
+            "buses": fleet_size,
+            "seeded": dataset["counts"],
+            "seedSec": round(seed_elapsed, 3),
+            "scenarios": {},
+        }
+        for name in scenarios:
+            make_request = build_request_factory(name, dataset, user_token, admin_token, rng_lock, rng)
+            fleet_result["scenarios"][name] = run_scenario(
+                client, make_request, args.requests, args.warmup, args.concurrency, extra_headers, server_pid
+            )
+            print(f"  {fleet_size} buses · {name}: "
+                  f"{fleet_result['scenarios'][name]['throughputRps']} req/s", file=sys.stderr)
+        results.append(fleet_result)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "target": args.base_url or "in-process",
+        "mongoUri": args.mongo_uri if args.mongo_uri.startswith("mongomock") else "mongodb",
+        "concurrency": args.concurrency,
+        "requestsPerScenario": args.requests,
+        "acceptEncoding": args.accept_encoding,
+        "serverPid": server_pid,
+        # In-process the driver is the server, and resetting VmHWM also resets ru_maxrss
+        "driverMaxRssKb": driver_max_rss_kb() if args.base_url else None,
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Synthetic data generator for the benchmark suite.
+
+Builds fleets of buses with realistic `route.stops`, matching schedules with
+`stop_timings`, and users, then bulk-inserts them into the configured database.
+Everything is driven by a seeded RNG so two runs with the same arguments
+produce the same dataset.
+"""
+import random
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+
+# City centres used to scatter stops around (lat, lng)
+CITIES = {
+    "Kolkata": (22.5726, 88.3639),
+    "Mumbai": (19.0760, 72.8777),
+    "Delhi": (28.6139, 77.2090),
+    "Bangalore": (12.9716, 77.5946),
+    "Chennai": (13.0827, 80.2707),
+    "Pune": (18.5204, 73.8567),
+}
+STOPS_PER_CITY = 400
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+BENCH_PASSWORD = "bench-password"
+INSERT_CHUNK = 5000
+
+
+def build_stop_pool(rng):
+    """Creates a fixed pool of named stops per city so routes share stops."""
+    pool = {}
+    for city, (lat, lng) in CITIES.items():
+        pool[city] = [
+            {
+                "name": f"{city} Stop {i}",
+                "lat": round(lat + rng.uniform(-0.15, 0.15), 6),
+                "lng": round(lng + rng.uniform(-0.15, 0.15), 6),
+            }
+            for i in range(STOPS_PER_CITY)
+        ]
+    return pool
+
+
+def make_bus(rng, index, stop_pool):
+    city = rng.choice(list(CITIES))
+    picked = rng.sample(stop_pool[city], rng.randint(8, 30))
+    stops = [dict(stop, order=order) for order, stop in enumerate(picked, start=1)]
+    first = stops[0]
+    now = datetime.utcnow()
+    return {
+        "busCategory": rng.choice(["CITY", "EXPRESS", "INTERCITY"]),
+        "busNumber": f"WB-{index:06d}",
+        "type": rng.choice(["AC", "NON_AC"]),
+        "capacity": rng.choice([30, 40, 50, 60]),
+        "registrationNo": f"REG{index:08d}",
+        "gpsDeviceId": f"GPS{index:08d}",
+        "currentLocation": {"lat": first["lat"], "lng": first["lng"]},
+        "status": rng.choice(["ACTIVE", "ACTIVE", "ACTIVE", "INACTIVE", "MAINTENANCE"]),
+        "createdAt": now,
+        "updatedAt": now,
+        "route": {
+            "name": f"{stops[0]['name']} - {stops[-1]['name']}",
+            "city": city,
+            "stops": stops,
+        },
+    }
+
+
+def make_schedule(rng, bus_id, bus):
+    minute = rng.randint(5 * 60, 22 * 60)
+    timings = []
+    for stop in bus["route"]["stops"]:
+        arrival = minute
+        minute += rng.randint(0, 2)
+        timings.append({
+            "stop_id": str(stop["order"]),
+            "stop_name": stop["name"],
+            "arrivalTime": f"{(arrival // 60) % 24:02d}:{arrival % 60:02d}",
+            "departureTime": f"{(minute // 60) % 24:02d}:{minute % 60:02d}",
+        })
+        minute += rng.randint(2, 8)
+    now = datetime.utcnow()
+    return {
+        "busId": bus_id,
+        "daysActive": sorted(rng.sample(WEEKDAYS, rng.randint(3, 7)), key=WEEKDAYS.index),
+        "stop_timings": timings,
+        "frequencyMin": rng.choice([None, 10, 15, 30]),
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+def make_users(count, password_hash):
+    now = datetime.utcnow()
+    return [
+        {
+            "name": f"Bench User {i}",
+            "email": f"bench{i}@example.com",
+            "phone": f"9{i:09d}",
+            "passwordHash": password_hash,
+            "role": "ADMIN" if i == 0 else "USER",
+            "status": "ACTIVE",
+            "createdAt": now,
+            "updatedAt": now,
+            # mongomock rejects $max against a null field (MongoDB accepts it), and
+            # login queues lastLogin with $max; seeded accounts have logged in before
+            "lastLogin": now,
+            "totalBookings": 0,
+            "totalSpent": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def _insert_chunked(collection, docs):
+    for start in range(0, len(docs), INSERT_CHUNK):
+        collection.insert_many(docs[start:start + INSERT_CHUNK], ordered=False)
+
+
+def seed(db, num_buses, num_users, seed_value=42):
+    """
+    Drops and refills the buses_data, schedules and users collections.
+    Returns a small summary used by the load driver to build requests.
+    """
+    rng = random.Random(seed_value)
+    for name in ("buses_data", "schedules", "users"):
+        db[name].drop()
+
+    stop_pool = build_stop_pool(rng)
+    buses = [make_bus(rng, i, stop_pool) for i in range(num_buses)]
+    _insert_chunked(db.buses_data, buses)  # insert_many fills in each doc's _id
+
+    schedules = []
+    for bus in buses:
+        for _ in range(rng.randint(1, 3)):
+            schedules.append(make_schedule(rng, bus["_id"], bus))
+    _insert_chunked(db.schedules, schedules)
+
+    # Hashing is deliberately slow, so every bench user shares one hash
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    users = make_users(num_users, password_hash)
+    _insert_chunked(db.users, users)
+
+    search_pairs = []
+    for bus in rng.sample(buses, min(len(buses), 200)):
+        stops = bus["route"]["stops"]
+        i, j = sorted(rng.sample(range(len(stops)), 2))
+        search_pairs.append((stops[i]["name"], stops[j]["name"]))
+
+    return {
+        "bus_ids": [str(bus["_id"]) for bus in buses],
+        "search_pairs": search_pairs,
+        "admin_id": str(users[0]["_id"]),
+        "user_emails": [user["email"] for user in users],
+        "counts": {
+            "buses": len(buses),
+            "schedules": len(schedules),
+            "users": len(users),
+        },
+    }
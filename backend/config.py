@@ -6,3 +6,68 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/mybus")
+    MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "mybus")
+
+    # On-demand request profiling (see utils/profiler.py)
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+    PROFILE_STORE_MAX_BYTES = int(os.getenv("PROFILE_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Response compression (see utils/compression.py)
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+    COMPRESS_CACHE_MAX_BYTES = int(os.getenv("COMPRESS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    COMPRESS_CACHE_PATHS = [p for p in os.getenv("COMPRESS_CACHE_PATHS", "/buses,/schedules").split(",") if p]
+
+    # Delta sync (see models/sync_model.py)
+    SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+    SYNC_TOMBSTONE_TTL_DAYS = int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", "30"))
+    # Changes stamped this long before a token was issued are sent again with the next call
+    SYNC_GRACE_SECONDS = int(os.getenv("SYNC_GRACE_SECONDS", "5"))
+
+    # Write-behind buffer for lastLogin / activity counters (see utils/write_behind.py)
+    USER_ACTIVITY_FLUSH_SECONDS = float(os.getenv("USER_ACTIVITY_FLUSH_SECONDS", "2"))
+    USER_ACTIVITY_MAX_PENDING = int(os.getenv("USER_ACTIVITY_MAX_PENDING", "1000"))
+    USER_ACTIVITY_MAX_RETRIES = int(os.getenv("USER_ACTIVITY_MAX_RETRIES", "5"))
+
+    # GPS snapping (see utils/route_geometry.py)
+    OFF_ROUTE_METERS = float(os.getenv("OFF_ROUTE_METERS", "150"))
+
+    # Seat reservations (see models/booking_model.py)
+    BOOKING_HOLD_SECONDS = int(os.getenv("BOOKING_HOLD_SECONDS", "300"))
+    BOOKING_MAX_SEATS = int(os.getenv("BOOKING_MAX_SEATS", "6"))
+    BOOKING_RELEASE_BATCH = int(os.getenv("BOOKING_RELEASE_BATCH", "100"))
+    BOOKING_FARE_PER_SEGMENT = float(os.getenv("BOOKING_FARE_PER_SEGMENT", "10"))
+
+    # Shared mmapped timetable snapshot (see utils/timetable_snapshot.py); empty disables it
+    TIMETABLE_DIR = os.getenv("TIMETABLE_DIR", "")
+    TIMETABLE_CHECK_SECONDS = float(os.getenv("TIMETABLE_CHECK_SECONDS", "1"))
+    TIMETABLE_REBUILD_DELAY = float(os.getenv("TIMETABLE_REBUILD_DELAY", "2"))
+
+    # Read-through cache for bus/schedule lookups (see utils/cache.py); backend "memory" or "redis"
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "10"))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Dashboard counters (see models/stats_model.py); 0 disables the periodic reconcile
+    STATS_RECONCILE_SECONDS = float(os.getenv("STATS_RECONCILE_SECONDS", "3600"))
+    STATS_RECONCILE_SETTLE_SECONDS = float(os.getenv("STATS_RECONCILE_SETTLE_SECONDS", "2"))
+
+    # GTFS feed export/import (see utils/gtfs.py)
+    GTFS_AGENCY_NAME = os.getenv("GTFS_AGENCY_NAME", "MyBus")
+    GTFS_AGENCY_URL = os.getenv("GTFS_AGENCY_URL", "https://mybus.example.com")
+    GTFS_TIMEZONE = os.getenv("GTFS_TIMEZONE", "Asia/Kolkata")
+    GTFS_CALENDAR_DAYS = int(os.getenv("GTFS_CALENDAR_DAYS", "365"))
+    GTFS_FREQUENCY_END = os.getenv("GTFS_FREQUENCY_END", "24:00")
+    GTFS_BATCH_SIZE = int(os.getenv("GTFS_BATCH_SIZE", "1000"))
+    GTFS_IMPORT_CHUNK = int(os.getenv("GTFS_IMPORT_CHUNK", "1000"))
+    GTFS_IMPORT_CAPACITY = int(os.getenv("GTFS_IMPORT_CAPACITY", "40"))
+
+    # Stale-device / off-route / bunching detector (see utils/fleet_monitor.py); 0 disables the ticks
+    FLEET_TICK_SECONDS = float(os.getenv("FLEET_TICK_SECONDS", "5"))
+    FLEET_STALE_SECONDS = float(os.getenv("FLEET_STALE_SECONDS", "120"))
+    FLEET_BUNCHING_METERS = float(os.getenv("FLEET_BUNCHING_METERS", "300"))
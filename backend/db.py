@@ -1,11 +1,100 @@
+import os
+import threading
 from pymongo import MongoClient
+from pymongo.database import Database
 from config import Config
+from utils.profiler import mongo_command_listener
 
-try:
-    client = MongoClient(Config.MONGO_URI)
-    db = client["mybus"]
-    print("✅ MongoDB Connected Successfully!")
-except Exception as e:
-    print(f"❌ MongoDB Connection Error: {e}")
-    db = None
+# The client is created lazily, once per process. MongoClient starts background
+# threads and sockets that must not be shared across fork(), so a preforked
+# worker gets a fresh client the first time it touches the database (or when
+# the server calls reset_client() right after forking).
+_client = None
+_client_pid = None
+_collections = {}
+_lock = threading.Lock()
 
+
+def _connect():
+    if Config.MONGO_URI.startswith("mongomock://"):
+        # In-memory stand-in used by the benchmark suite (pip install mongomock)
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(Config.MONGO_URI, event_listeners=[mongo_command_listener])
+
+
+def get_client():
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                try:
+                    _client = _connect()
+                    _client_pid = os.getpid()
+                    _collections.clear()
+                    print(f"✅ MongoDB Connected Successfully! (pid {_client_pid})")
+                except Exception as e:
+                    print(f"❌ MongoDB Connection Error: {e}")
+                    raise
+    return _client
+
+
+def get_database():
+    return get_client()[Config.MONGO_DB_NAME]
+
+
+def get_collection(name):
+    get_client()  # Reconnects (and drops cached collections) after a fork
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_database()[name]
+    return collection
+
+
+def reset_client(close=False):
+    """
+    Forgets the current client so the next access reconnects.
+    Call with close=True in the process that owns the client (e.g. the server
+    master after it has set up indexes); a forked child should only drop it.
+    """
+    global _client, _client_pid
+    with _lock:
+        if close and _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+        _collections.clear()
+
+
+class _LazyCollection:
+    """Stands in for a pymongo Collection and resolves it on every use."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_collection(self._name), attr)
+
+    def __repr__(self):
+        return f"<lazy collection {self._name!r}>"
+
+
+class _LazyDatabase:
+    """
+    Module-level `db` handle. `db.<name>` and `db[<name>]` return lazy
+    collections, so models can bind them at import time; Database methods such
+    as `db.command` go straight to the current process's database.
+    """
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if hasattr(Database, name):
+            return getattr(get_database(), name)
+        return _LazyCollection(name)
+
+    def __getitem__(self, name):
+        return _LazyCollection(name)
+
+
+db = _LazyDatabase()
@@ -0,0 +1,64 @@
+"""
+Production server settings: N preforked workers, each with its own Mongo pool.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Graceful reload (new code, finish in-flight requests): kill -HUP <master pid>
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Workers import the app themselves so HUP reloads pick up new code
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+accesslog = "-"
+
+
+STARTUP_TASKS = "from app import ensure_indexes, compile_timetable; ensure_indexes(); compile_timetable()"
+
+
+def _run_startup_tasks(server):
+    # Indexes, backfills and the timetable snapshot once per deploy, in a child process: the master
+    # never imports the app, so a HUP reload starts workers on the new code (and the master holds no
+    # Mongo sockets or monitor threads for workers to inherit)
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_TASKS], cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        server.log.error(f"Startup tasks failed (exit code {result.returncode})")
+
+
+def on_starting(server):
+    _run_startup_tasks(server)
+
+
+def on_reload(server):
+    # New code may bring new indexes or a new snapshot layout
+    _run_startup_tasks(server)
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker()
+
+
+def post_worker_init(worker):
+    # Runs after the app is loaded and before the worker accepts connections
+    from app import warm_up
+    try:
+        warm_up()
+    except Exception as e:
+        worker.log.error(f"Warm-up failed: {e}")
+
+
+def worker_exit(server, worker):
+    from models.user_model import user_activity
+    user_activity.flush()
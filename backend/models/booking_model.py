@@ -0,0 +1,281 @@
+import math
+from datetime import datetime, timedelta
+from db import db
+from config import Config
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.bus_model import BusModel
+from models.schedule_model import ScheduleModel
+from models.user_model import UserModel
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class BookingError(Exception):
+    """A booking request that cannot be honoured; 'status' is the HTTP code to answer with."""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+class BookingModel:
+    """
+    Seat holds and bookings per trip (a schedule on a service date) and per stop segment.
+
+    Each trip has one small occupancy document holding the number of free seats
+    on every segment between consecutive stops. A hold from stop i to stop j
+    takes seats on segments i..j-1 with a single conditional update that only
+    matches while every one of those segments still has enough free seats, so
+    concurrent bookers can never overbook. Holds expire after HOLD_SECONDS;
+    expired holds are released lazily, exactly once each, when a trip runs out
+    of seats or its availability is read.
+    """
+    trips = db.trip_occupancy
+    holds = db.seat_holds
+
+    # --- Trips ---
+    @staticmethod
+    def normalize_date(service_date):
+        """
+        Returns the service date as YYYY-MM-DD. strptime also accepts
+        '2026-1-5', which would key a second trip with its own seats, so only
+        the zero-padded form is allowed.
+        """
+        try:
+            normalized = datetime.strptime(service_date, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise BookingError("date must be YYYY-MM-DD", 400)
+        if normalized != service_date:
+            raise BookingError("date must be YYYY-MM-DD", 400)
+        return normalized
+
+    @staticmethod
+    def trip_id(schedule_id, service_date):
+        return f"{schedule_id}:{service_date}"
+
+    @staticmethod
+    def fare(from_index, to_index, seats):
+        """Price of a hold: BOOKING_FARE_PER_SEGMENT per seat per segment travelled."""
+        return round(Config.BOOKING_FARE_PER_SEGMENT * (to_index - from_index) * seats, 2)
+
+    @staticmethod
+    def _load_trip_template(schedule_id, service_date):
+        """Reads the schedule and bus to build a fresh occupancy document."""
+        service_date = BookingModel.normalize_date(service_date)
+        date = datetime.strptime(service_date, "%Y-%m-%d")
+
+        schedule = ScheduleModel.get_schedule_by_id(schedule_id)
+        if not schedule:
+            raise BookingError("Schedule not found", 404)
+        days = schedule.get("daysActive") or []
+        if days and WEEKDAYS[date.weekday()] not in days:
+            raise BookingError(f"Schedule does not run on {WEEKDAYS[date.weekday()]}", 400)
+
+        stops = [t.get("stop_name") for t in schedule.get("stop_timings") or []]
+        if len(stops) < 2:
+            raise BookingError("Schedule needs at least two stops to book", 400)
+        bus = BusModel.get_bus_by_id(schedule["busId"])
+        if not bus:
+            raise BookingError("Bus not found", 404)
+
+        capacity = int(bus.get("capacity") or 0)
+        return {
+            "_id": BookingModel.trip_id(schedule_id, service_date),
+            "scheduleId": ObjectId(schedule_id),
+            "busId": ObjectId(bus["_id"]),
+            "serviceDate": service_date,
+            "capacity": capacity,
+            "stops": stops,
+            "free": [capacity] * (len(stops) - 1),
+            "createdAt": datetime.utcnow()
+        }
+
+    @staticmethod
+    def _ensure_trip(schedule_id, service_date):
+        template = BookingModel._load_trip_template(schedule_id, service_date)
+        try:
+            BookingModel.trips.insert_one(template)
+        except DuplicateKeyError:
+            pass  # Another booker created it first
+        return template
+
+    @staticmethod
+    def get_availability(schedule_id, service_date):
+        """Free seats on every segment of a trip."""
+        service_date = BookingModel.normalize_date(service_date)
+        trip_id = BookingModel.trip_id(schedule_id, service_date)
+        BookingModel.release_expired(trip_id)
+        trip = BookingModel.trips.find_one({"_id": trip_id})
+        if not trip:
+            trip = BookingModel._load_trip_template(schedule_id, service_date)
+        return {
+            "tripId": trip["_id"],
+            "capacity": trip["capacity"],
+            "stops": trip["stops"],
+            "free": trip["free"],
+            "minFree": min(trip["free"])
+        }
+
+    # --- Holds ---
+    @staticmethod
+    def _take_seats(trip_id, from_index, to_index, seats):
+        """Atomically takes seats on segments from_index..to_index-1; returns the trip or None."""
+        segments = range(from_index, to_index)
+        query = {"_id": trip_id, f"free.{to_index - 1}": {"$exists": True}}
+        query.update({f"free.{i}": {"$gte": seats} for i in segments})
+        return BookingModel.trips.find_one_and_update(
+            query,
+            {"$inc": {f"free.{i}": -seats for i in segments}},
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def _give_back(trip_id, from_index, to_index, seats):
+        BookingModel.trips.update_one(
+            {"_id": trip_id},
+            {"$inc": {f"free.{i}": seats for i in range(from_index, to_index)}}
+        )
+
+    @staticmethod
+    def create_hold(user_id, schedule_id, service_date, from_index, to_index, seats=1):
+        """Holds 'seats' from stop 'from_index' to stop 'to_index' for HOLD_SECONDS."""
+        try:
+            from_index, to_index, seats = int(from_index), int(to_index), int(seats)
+        except (TypeError, ValueError):
+            raise BookingError("fromIndex, toIndex and seats must be integers", 400)
+        if from_index < 0 or to_index <= from_index:
+            raise BookingError("toIndex must come after fromIndex", 400)
+        if not 1 <= seats <= Config.BOOKING_MAX_SEATS:
+            raise BookingError(f"seats must be between 1 and {Config.BOOKING_MAX_SEATS}", 400)
+        try:
+            ObjectId(schedule_id)
+        except (InvalidId, TypeError):
+            raise BookingError("Schedule not found", 404)
+        service_date = BookingModel.normalize_date(service_date)
+
+        trip_id = BookingModel.trip_id(schedule_id, service_date)
+        taken = BookingModel._take_seats(trip_id, from_index, to_index, seats)
+        if taken is None:
+            # The trip has no occupancy document yet, the stops are out of range, or it is full
+            trip = BookingModel.trips.find_one({"_id": trip_id}, {"free": 1})
+            created = trip is None
+            if created:
+                trip = BookingModel._ensure_trip(schedule_id, service_date)
+            if to_index > len(trip["free"]):
+                raise BookingError("Stop index out of range", 400)
+            if not created and BookingModel.release_expired(trip_id) == 0:
+                raise BookingError("Not enough seats available")
+            taken = BookingModel._take_seats(trip_id, from_index, to_index, seats)
+            if taken is None:
+                raise BookingError("Not enough seats available")
+
+        now = datetime.utcnow()
+        hold = {
+            "tripId": trip_id,
+            "scheduleId": ObjectId(schedule_id),
+            "serviceDate": service_date,
+            "userId": ObjectId(user_id),
+            "fromIndex": from_index,
+            "toIndex": to_index,
+            "seats": seats,
+            "status": "HELD",
+            "createdAt": now,
+            "expiresAt": now + timedelta(seconds=Config.BOOKING_HOLD_SECONDS)
+        }
+        try:
+            result = BookingModel.holds.insert_one(hold)
+        except Exception:
+            BookingModel._give_back(trip_id, from_index, to_index, seats)
+            raise
+        hold["_id"] = result.inserted_id
+        return hold
+
+    @staticmethod
+    def confirm_hold(hold_id, user_id, amount=None):
+        """
+        Turns an unexpired hold into a booking. The amount charged is the
+        server-side fare of the hold; a client 'amount', when sent, must match it.
+        """
+        if amount is not None:
+            try:
+                amount = float(amount)
+            except (TypeError, ValueError):
+                raise BookingError("amount must be a number", 400)
+            if not math.isfinite(amount) or amount < 0:
+                raise BookingError("amount must be a finite, non-negative number", 400)
+        try:
+            query = {"_id": ObjectId(hold_id), "userId": ObjectId(user_id), "status": "HELD",
+                     "expiresAt": {"$gt": datetime.utcnow()}}
+        except InvalidId:
+            raise BookingError("Hold not found", 404)
+        held = BookingModel.holds.find_one(query, {"fromIndex": 1, "toIndex": 1, "seats": 1})
+        if not held:
+            raise BookingError("Hold not found or expired")
+        fare = BookingModel.fare(held["fromIndex"], held["toIndex"], held["seats"])
+        if amount is not None and round(amount, 2) != fare:
+            raise BookingError(f"amount does not match the fare ({fare})")
+
+        hold = BookingModel.holds.find_one_and_update(
+            query,
+            {"$set": {"status": "BOOKED", "amount": fare, "bookedAt": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not hold:
+            raise BookingError("Hold not found or expired")
+        UserModel.record_booking(user_id, fare)
+        return hold
+
+    @staticmethod
+    def cancel(hold_id, user_id):
+        """Releases a hold or cancels a booking, returning its seats to the trip."""
+        try:
+            hold = BookingModel.holds.find_one_and_update(
+                {"_id": ObjectId(hold_id), "userId": ObjectId(user_id), "status": {"$in": ["HELD", "BOOKED"]}},
+                {"$set": {"status": "CANCELLED", "cancelledAt": datetime.utcnow()}}
+            )
+        except InvalidId:
+            raise BookingError("Hold not found", 404)
+        if not hold:
+            raise BookingError("Hold not found", 404)
+        BookingModel._give_back(hold["tripId"], hold["fromIndex"], hold["toIndex"], hold["seats"])
+        if hold["status"] == "BOOKED":
+            UserModel.record_cancellation(user_id, hold.get("amount", 0))
+        return hold
+
+    @staticmethod
+    def release_expired(trip_id=None):
+        """
+        Returns seats of expired holds to their trips. Each hold is flipped from
+        HELD to EXPIRED by exactly one caller, and only that caller gives its
+        seats back. Returns the number of holds released.
+        """
+        query = {"status": "HELD", "expiresAt": {"$lte": datetime.utcnow()}}
+        if trip_id:
+            query["tripId"] = trip_id
+        released = 0
+        for candidate in BookingModel.holds.find(query, {"_id": 1}).limit(Config.BOOKING_RELEASE_BATCH):
+            hold = BookingModel.holds.find_one_and_update(
+                {"_id": candidate["_id"], "status": "HELD"},
+                {"$set": {"status": "EXPIRED"}}
+            )
+            if hold:
+                BookingModel._give_back(hold["tripId"], hold["fromIndex"], hold["toIndex"], hold["seats"])
+                released += 1
+        return released
+
+    @staticmethod
+    def get_user_bookings(user_id):
+        try:
+            return list(BookingModel.holds.find({"userId": ObjectId(user_id)}).sort("createdAt", -1).limit(100))
+        except InvalidId:
+            return []
+
+    @staticmethod
+    def ensure_indexes():
+        BookingModel.holds.create_index([("tripId", ASCENDING), ("status", ASCENDING), ("expiresAt", ASCENDING)])
+        BookingModel.holds.create_index([("status", ASCENDING), ("expiresAt", ASCENDING)])
+        BookingModel.holds.create_index([("userId", ASCENDING), ("createdAt", ASCENDING)])
@@ -3,6 +3,12 @@ from datetime import datetime
 from db import db
 from bson import ObjectId
 from bson.errors import InvalidId # Import InvalidId to handle bad ID formats
+from models.sync_model import SyncModel
+from models.stats_model import StatsModel, TRACKED_FIELDS, apply_set
+from utils.route_geometry import build_geometry, locate
+from utils.timetable_snapshot import timetable
+from utils.cache import read_cache
+from utils.fleet_monitor import fleet_monitor
 
 class BusModel:
     collection = db.buses_data
@@ -24,6 +30,7 @@ class BusModel:
         The 'id' field is redundant and can be removed if not used elsewhere.
         """
         try:
+            route_geometry = build_geometry(route)
             bus_data = {
                 # Bus Info
                 "busCategory": bus_category,
@@ -34,22 +41,27 @@ class BusModel:
                 "gpsDeviceId": gps_device_id,
 
                 # Location & Status
-                "currentLocation": current_location if current_location else {},
+                "currentLocation": locate(current_location, route_geometry) if current_location else {},
                 "status": status,
 
                 # Timestamps
                 "createdAt": datetime.utcnow(),
                 "updatedAt": datetime.utcnow(),
+                "syncSeq": SyncModel.next_seq(),
 
-                # Routes + Stops
-                "route": route if route else {}
+                # Routes + Stops, and the polyline GPS fixes are snapped to
+                "route": route if route else {},
+                "routeGeometry": route_geometry
             }
 
             # Let MongoDB handle the _id creation
             result = BusModel.collection.insert_one(bus_data)
+            StatsModel.record_bus(None, bus_data)
+            fleet_monitor.observe(result.inserted_id, bus_data)
+            timetable.request_rebuild()
             
             # Fetch the inserted document to return it with the string ID
-            new_bus = BusModel.collection.find_one({"_id": result.inserted_id})
+            new_bus = BusModel.collection.find_one({"_id": result.inserted_id}, {"routeGeometry": 0})
             if new_bus:
                 new_bus["_id"] = str(new_bus["_id"])
             return new_bus
@@ -59,51 +71,141 @@ class BusModel:
 
     @staticmethod
     def get_all_buses():
-        """Fetch all buses and serialize their '_id' to a string"""
+        """Fetch all buses (without the internal routeGeometry) and serialize their '_id' to a string"""
         try:
-            buses = list(BusModel.collection.find({}))
+            buses = list(BusModel.collection.find({}, {"routeGeometry": 0}))
             for bus in buses:
                 bus["_id"] = str(bus["_id"]) # Serialize ID
             return buses
         except Exception as e:
             raise Exception(f"Error fetching buses: {str(e)}")
 
+    @staticmethod
+    def get_buses_by_ids(bus_ids):
+        """Fetch several buses by '_id' in one query"""
+        try:
+            buses = list(BusModel.collection.find({"_id": {"$in": [ObjectId(b) for b in bus_ids]}}, {"routeGeometry": 0}))
+            for bus in buses:
+                bus["_id"] = str(bus["_id"])
+            return buses
+        except Exception as e:
+            raise Exception(f"Error fetching buses: {str(e)}")
+
     @staticmethod
     def get_bus_by_id(bus_id):
         """ ✅ CORRECTED: Fetch a single bus by its '_id' """
         try:
             # The fix is to query by '_id' and convert the string to an ObjectId
-            bus = BusModel.collection.find_one({"_id": ObjectId(bus_id)})
-            if bus:
-                bus["_id"] = str(bus["_id"]) # Serialize ID for the response
-            return bus
+            object_id = ObjectId(bus_id)
+
+            def load():
+                bus = BusModel.collection.find_one({"_id": object_id}, {"routeGeometry": 0})
+                if bus:
+                    bus["_id"] = str(bus["_id"]) # Serialize ID for the response
+                return bus
+
+            return read_cache.get_or_load(BusModel.cache_key(bus_id), load)
         except InvalidId:
             # This handles cases where the bus_id string is not a valid format
             return None
         except Exception as e:
             raise Exception(f"Error fetching bus: {str(e)}")
 
+    @staticmethod
+    def cache_key(bus_id):
+        return f"bus:{bus_id}"
+
     @staticmethod
     def update_bus(bus_id, update_data):
         """ ✅ CORRECTED: Update bus details by its '_id' """
         try:
+            # Keep the precomputed geometry in step with the route, and snap new fixes to it
+            if "route" in update_data:
+                update_data["routeGeometry"] = build_geometry(update_data["route"])
+            if update_data.get("currentLocation"):
+                geometry = update_data["routeGeometry"] if "route" in update_data else BusModel.get_route_geometry(bus_id)
+                update_data["currentLocation"] = locate(update_data["currentLocation"], geometry)
+
             update_data["updatedAt"] = datetime.utcnow()
-            result = BusModel.collection.update_one(
+            update_data["syncSeq"] = SyncModel.next_seq()
+            # The counted fields before the write tell the dashboard counters what moved
+            before = BusModel.collection.find_one_and_update(
                 {"_id": ObjectId(bus_id)}, # Query by '_id'
-                {"$set": update_data}
+                {"$set": update_data},
+                projection=TRACKED_FIELDS["bus"]
             )
-            return result.modified_count > 0
+            if before is None:
+                return False
+            read_cache.invalidate(BusModel.cache_key(bus_id))
+            StatsModel.record_bus(before, apply_set(before, update_data))
+            fleet_monitor.observe(bus_id, update_data)
+            if "route" in update_data:
+                timetable.request_rebuild()
+            return True
         except InvalidId:
             return False
         except Exception as e:
             raise Exception(f"Error updating bus: {str(e)}")
 
+    @staticmethod
+    def get_route_geometry(bus_id):
+        """Fetch only the precomputed route polyline of a bus."""
+        bus = BusModel.collection.find_one({"_id": ObjectId(bus_id)}, {"routeGeometry": 1})
+        return bus.get("routeGeometry") if bus else None
+
+    @staticmethod
+    def backfill_route_geometry():
+        """Precomputes routeGeometry for buses created before GPS snapping existed."""
+        buses = BusModel.collection.find({"routeGeometry": {"$exists": False}}, {"route": 1})
+        for bus in buses:
+            BusModel.collection.update_one(
+                {"_id": bus["_id"]},
+                {"$set": {"routeGeometry": build_geometry(bus.get("route"))}}
+            )
+
+    @staticmethod
+    def update_location(bus_id, location):
+        """Store a GPS fix snapped to the bus's route; returns the stored location or None."""
+        try:
+            update_data = {"currentLocation": location}
+            if not BusModel.update_bus(bus_id, update_data):
+                return None
+            return update_data["currentLocation"]
+        except InvalidId:
+            return None
+
+    @staticmethod
+    def get_progress(bus_id):
+        """Fetch the bus's last fix and its progress along the route (no geometry math)."""
+        try:
+            bus = BusModel.collection.find_one(
+                {"_id": ObjectId(bus_id)},
+                {"currentLocation": 1, "routeGeometry.length": 1, "route.name": 1}
+            )
+            if bus:
+                bus["_id"] = str(bus["_id"])
+            return bus
+        except InvalidId:
+            return None
+        except Exception as e:
+            raise Exception(f"Error fetching bus progress: {str(e)}")
+
     @staticmethod
     def delete_bus(bus_id):
         """ ✅ CORRECTED: Delete a bus by its '_id' """
         try:
-            result = BusModel.collection.delete_one({"_id": ObjectId(bus_id)}) # Query by '_id'
-            return result.deleted_count > 0
+            deleted = BusModel.collection.find_one_and_delete(
+                {"_id": ObjectId(bus_id)}, # Query by '_id'
+                projection=TRACKED_FIELDS["bus"]
+            )
+            if deleted is None:
+                return False
+            SyncModel.record_deletes("bus", [deleted["_id"]])
+            read_cache.invalidate(BusModel.cache_key(bus_id))
+            StatsModel.record_bus(deleted, None)
+            fleet_monitor.forget(bus_id)
+            timetable.request_rebuild()
+            return True
         except InvalidId:
             return False
         except Exception as e:
@@ -2,6 +2,9 @@ from datetime import datetime
 from db import db
 from bson import ObjectId
 from bson.errors import InvalidId
+from models.sync_model import SyncModel
+from utils.cache import read_cache
+from utils.timetable_snapshot import timetable
 
 class ScheduleModel:
     """
@@ -25,9 +28,12 @@ class ScheduleModel:
                 "stop_timings": stop_timings, # <-- REPLACED old time fields
                 "frequencyMin": frequency_min,
                 "createdAt": datetime.utcnow(),
-                "updatedAt": datetime.utcnow()
+                "updatedAt": datetime.utcnow(),
+                "syncSeq": SyncModel.next_seq()
             }
             result = ScheduleModel.collection.insert_one(schedule_data)
+            read_cache.invalidate(ScheduleModel.bus_cache_key(bus_id))
+            timetable.request_rebuild()
             
             # Fetch the new document to return it
             new_schedule = ScheduleModel.collection.find_one({"_id": result.inserted_id})
@@ -53,10 +59,15 @@ class ScheduleModel:
     def get_schedule_by_id(schedule_id):
         """Fetches a single schedule by its '_id'."""
         try:
-            schedule = ScheduleModel.collection.find_one({"_id": ObjectId(schedule_id)})
-            if schedule:
-                schedule["_id"] = str(schedule["_id"])
-            return schedule
+            object_id = ObjectId(schedule_id)
+
+            def load():
+                schedule = ScheduleModel.collection.find_one({"_id": object_id})
+                if schedule:
+                    schedule["_id"] = str(schedule["_id"])
+                return schedule
+
+            return read_cache.get_or_load(ScheduleModel.cache_key(schedule_id), load)
         except InvalidId:
             return None
         except Exception as e:
@@ -66,25 +77,69 @@ class ScheduleModel:
     def get_schedules_by_bus_id(bus_id):
         """Fetches all schedules for a specific bus."""
         try:
-            schedules = list(ScheduleModel.collection.find({"busId": ObjectId(bus_id)}))
-            for schedule in schedules:
-                schedule["_id"] = str(schedule["_id"])
-            return schedules
+            object_id = ObjectId(bus_id)
+
+            def load():
+                schedules = list(ScheduleModel.collection.find({"busId": object_id}))
+                for schedule in schedules:
+                    schedule["_id"] = str(schedule["_id"])
+                return schedules
+
+            return read_cache.get_or_load(ScheduleModel.bus_cache_key(bus_id), load)
         except InvalidId:
             return []
         except Exception as e:
             raise Exception(f"Error fetching schedules by bus ID: {str(e)}")
 
+    @staticmethod
+    def get_snapshot_schedules(bus_id):
+        """
+        Returns the compiled JSON body of a bus's schedules from the shared
+        timetable snapshot, or None when there is no snapshot, the bus is not
+        in it, or a schedule was written or deleted since it was compiled
+        (the caller then reads through get_schedules_by_bus_id).
+        """
+        try:
+            snapshot = timetable.get()
+            if snapshot is None:
+                return None
+            newer = {"syncSeq": {"$gt": snapshot.version}}
+            if ScheduleModel.collection.find_one(newer, {"_id": 1}) is not None:
+                return None
+            if SyncModel.tombstones.find_one(dict(newer, kind="schedule"), {"_id": 1}) is not None:
+                return None
+            return snapshot.schedules_json(bus_id)
+        except Exception as e:
+            raise Exception(f"Error fetching schedules by bus ID: {str(e)}")
+
+    @staticmethod
+    def cache_key(schedule_id):
+        return f"schedule:{schedule_id}"
+
+    @staticmethod
+    def bus_cache_key(bus_id):
+        return f"schedules:bus:{bus_id}"
+
     @staticmethod
     def update_schedule(schedule_id, update_data):
         """Updates schedule details by its '_id' and returns a boolean."""
         try:
             update_data["updatedAt"] = datetime.utcnow()
-            result = ScheduleModel.collection.update_one(
+            update_data["syncSeq"] = SyncModel.next_seq()
+            # The previous busId tells which per-bus list to invalidate
+            before = ScheduleModel.collection.find_one_and_update(
                 {"_id": ObjectId(schedule_id)},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"busId": 1}
             )
-            return result.modified_count > 0
+            if before is None:
+                return False
+            stale = [ScheduleModel.cache_key(schedule_id), ScheduleModel.bus_cache_key(before["busId"])]
+            if "busId" in update_data:
+                stale.append(ScheduleModel.bus_cache_key(update_data["busId"]))
+            read_cache.invalidate(*stale)
+            timetable.request_rebuild()
+            return True
         except InvalidId:
             return False
         except Exception as e:
@@ -94,8 +149,16 @@ class ScheduleModel:
     def delete_schedule(schedule_id):
         """Deletes a schedule by its '_id' and returns a boolean."""
         try:
-            result = ScheduleModel.collection.delete_one({"_id": ObjectId(schedule_id)})
-            return result.deleted_count > 0
+            deleted = ScheduleModel.collection.find_one_and_delete(
+                {"_id": ObjectId(schedule_id)},
+                projection={"busId": 1}
+            )
+            if deleted is None:
+                return False
+            SyncModel.record_deletes("schedule", [deleted["_id"]])
+            read_cache.invalidate(ScheduleModel.cache_key(schedule_id), ScheduleModel.bus_cache_key(deleted["busId"]))
+            timetable.request_rebuild()
+            return True
         except InvalidId:
             return False
         except Exception as e:
@@ -105,7 +168,18 @@ class ScheduleModel:
     def delete_by_bus_id(bus_id):
         """Deletes all schedules for a specific bus (for cascading delete)."""
         try:
-            result = ScheduleModel.collection.delete_many({"busId": ObjectId(bus_id)})
+            # Collect the ids first so each deleted schedule gets a tombstone
+            schedule_ids = [s["_id"] for s in ScheduleModel.collection.find({"busId": ObjectId(bus_id)}, {"_id": 1})]
+            if not schedule_ids:
+                read_cache.invalidate(ScheduleModel.bus_cache_key(bus_id))
+                return 0
+            result = ScheduleModel.collection.delete_many({"_id": {"$in": schedule_ids}})
+            SyncModel.record_deletes("schedule", schedule_ids)
+            read_cache.invalidate(
+                ScheduleModel.bus_cache_key(bus_id),
+                *[ScheduleModel.cache_key(s) for s in schedule_ids]
+            )
+            timetable.request_rebuild()
             return result.deleted_count
         except InvalidId:
             return 0
@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from db import db
+from config import Config
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+# Counted fields per scope: dimension name -> document path
+DIMENSIONS = {
+    "bus": {"status": "status", "busCategory": "busCategory", "type": "type", "city": "route.city"},
+    "user": {"role": "role", "status": "status"},
+}
+
+# Field projection to fetch the counted values of an existing document
+TRACKED_FIELDS = {scope: {path: 1 for path in dims.values()} for scope, dims in DIMENSIONS.items()}
+
+SOURCES = {"bus": "buses_data", "user": "users"}
+
+_RECONCILE_LEASE_ID = "meta:reconcile"
+
+
+def _get_path(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if not isinstance(doc.get(part), dict):
+            doc[part] = {}
+        doc = doc[part]
+    doc[parts[-1]] = value
+
+
+def apply_set(doc, set_fields):
+    """Returns a copy of 'doc' with a $set document (dotted paths allowed) applied."""
+    result = dict(doc or {})
+    for path, value in set_fields.items():
+        if "." in path:
+            head = path.split(".", 1)[0]
+            result[head] = dict(result[head]) if isinstance(result.get(head), dict) else {}
+        _set_path(result, path, value)
+    return result
+
+
+class StatsModel:
+    """
+    Fleet and user counts for the admin dashboard, maintained incrementally.
+
+    One small counter document per (scope, dimension, value), e.g. the number
+    of buses whose status is ACTIVE, plus a total per scope. Model writes call
+    record_bus/record_user with the counted fields before and after the write,
+    and the difference is applied as one unordered bulk of $inc upserts.
+    Reading the stats is a scan of the counters, whose number depends on the
+    distinct values only, not on fleet or user count. reconcile() recounts
+    from the source collections with one $facet aggregation per scope and
+    conditionally corrects any counter that drifted.
+    """
+    collection = db.stats_counters
+
+    @staticmethod
+    def counter_id(scope, dimension, value):
+        return f"{scope}:{dimension}:{value}"
+
+    @staticmethod
+    def _deltas(scope, old, new):
+        deltas = {}
+
+        def add(dimension, value, step):
+            key = (dimension, value)
+            deltas[key] = deltas.get(key, 0) + step
+
+        for doc, step in ((old, -1), (new, 1)):
+            if doc is None:
+                continue
+            add("total", None, step)
+            for dimension, path in DIMENSIONS[scope].items():
+                add(dimension, _get_path(doc, path), step)
+        return {key: step for key, step in deltas.items() if step}
+
+    @staticmethod
+    def record(scope, old, new):
+        """
+        Applies one write to the counters: 'old' is the document before the
+        write (None for an insert), 'new' the document after it (None for a
+        delete). Only the counted fields need to be present. Counter failures
+        are logged, not raised: the write itself already succeeded and the
+        next reconcile() repairs the counts.
+        """
+        deltas = StatsModel._deltas(scope, old, new)
+        if not deltas:
+            return
+        requests = [
+            UpdateOne(
+                {"_id": StatsModel.counter_id(scope, dimension, value)},
+                {"$inc": {"count": step},
+                 "$setOnInsert": {"scope": scope, "dimension": dimension, "value": value}},
+                upsert=True
+            )
+            for (dimension, value), step in deltas.items()
+        ]
+        try:
+            StatsModel.collection.bulk_write(requests, ordered=False)
+        except Exception as e:
+            print(f"❌ Stats counter update failed, reconcile will repair it: {e}")
+
+    @staticmethod
+    def record_bus(old, new):
+        StatsModel.record("bus", old, new)
+
+    @staticmethod
+    def record_user(old, new):
+        StatsModel.record("user", old, new)
+
+    # --- Reading ---
+    @staticmethod
+    def get_stats():
+        """Returns {"buses": {...}, "users": {...}, "reconciledAt": ...} from the counters alone."""
+        stats = {}
+        for scope, dims in DIMENSIONS.items():
+            stats[scope] = {"total": 0, **{dimension: {} for dimension in dims}}
+        for counter in StatsModel.collection.find({"scope": {"$exists": True}}):
+            scope, dimension, count = counter["scope"], counter["dimension"], counter.get("count", 0)
+            if scope not in stats or count <= 0:
+                continue
+            if dimension == "total":
+                stats[scope]["total"] = count
+            elif dimension in stats[scope]:
+                value = counter.get("value")
+                stats[scope][dimension]["unknown" if value is None else str(value)] = count
+
+        meta = StatsModel.collection.find_one({"_id": _RECONCILE_LEASE_ID}) or {}
+        return {
+            "buses": stats["bus"],
+            "users": stats["user"],
+            "reconciledAt": meta.get("reconciledAt"),
+            "lastCorrections": meta.get("corrections", 0)
+        }
+
+    # --- Reconciliation ---
+    @staticmethod
+    def _count_from_source(scope):
+        """Exact counts for a scope with one $facet aggregation: {(dimension, value): count}."""
+        facets = {"total": [{"$count": "n"}]}
+        for dimension, path in DIMENSIONS[scope].items():
+            facets[dimension] = [{"$group": {"_id": f"${path}", "n": {"$sum": 1}}}]
+        result = next(db[SOURCES[scope]].aggregate([{"$facet": facets}]), {})
+
+        counts = {("total", None): result["total"][0]["n"] if result.get("total") else 0}
+        for dimension in DIMENSIONS[scope]:
+            for group in result.get(dimension, []):
+                counts[(dimension, group["_id"])] = group["n"]
+        return counts
+
+    @staticmethod
+    def _drift(scope):
+        """Stored counts and, for every drifted counter, truth minus stored."""
+        # Stored values first: an $inc landing during the recount then shows as drift
+        stored = {
+            (c["dimension"], c.get("value")): c.get("count")
+            for c in StatsModel.collection.find({"scope": scope})
+        }
+        truth = StatsModel._count_from_source(scope)
+        drift = {}
+        for key in set(truth) | set(stored):
+            count = truth.get(key, 0)
+            if stored.get(key) != count:
+                drift[key] = count - (stored.get(key) or 0)
+        return stored, drift
+
+    @staticmethod
+    def reconcile():
+        """
+        Recounts every scope from its source collection and fixes drifted
+        counters; returns the number fixed.
+
+        A model write changes the source document before it applies its $inc,
+        so a recount in between sees drift that the $inc is about to fix.
+        Drift is therefore only corrected when a second pass,
+        STATS_RECONCILE_SETTLE_SECONDS later, finds exactly the same drift, and
+        each fix applies only if the counter still holds the value read in that
+        pass. A write racing both passes can still leave a counter off by one
+        until the next run.
+        """
+        corrections = 0
+        for scope in DIMENSIONS:
+            _, first = StatsModel._drift(scope)
+            if not first:
+                continue
+            time.sleep(Config.STATS_RECONCILE_SETTLE_SECONDS)
+            stored, second = StatsModel._drift(scope)
+            requests = []
+            for key, delta in second.items():
+                if first.get(key) != delta:
+                    continue  # Still moving: left for the next run
+                dimension, value = key
+                counter_id = StatsModel.counter_id(scope, dimension, value)
+                count = (stored.get(key) or 0) + delta
+                if key in stored:
+                    requests.append(UpdateOne({"_id": counter_id, "count": stored[key]}, {"$set": {"count": count}}))
+                else:
+                    requests.append(UpdateOne(
+                        {"_id": counter_id},
+                        {"$setOnInsert": {"scope": scope, "dimension": dimension, "value": value, "count": count}},
+                        upsert=True
+                    ))
+            if requests:
+                try:
+                    result = StatsModel.collection.bulk_write(requests, ordered=False)
+                    corrections += result.modified_count + result.upserted_count
+                except BulkWriteError as e:
+                    # Two reconciles inserting the same missing counter: one wins
+                    corrections += e.details.get("nModified", 0) + e.details.get("nUpserted", 0)
+
+        StatsModel.collection.update_one(
+            {"_id": _RECONCILE_LEASE_ID},
+            {"$set": {"reconciledAt": datetime.utcnow(), "corrections": corrections}},
+            upsert=True
+        )
+        return corrections
+
+    @staticmethod
+    def claim_reconcile(interval_seconds):
+        """True for exactly one caller per interval across all workers (a lease on the meta document)."""
+        now = datetime.utcnow()
+        try:
+            claimed = StatsModel.collection.find_one_and_update(
+                {"_id": _RECONCILE_LEASE_ID, "$or": [{"leaseUntil": {"$lte": now}}, {"leaseUntil": {"$exists": False}}]},
+                {"$set": {"leaseUntil": now + timedelta(seconds=interval_seconds)}},
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception:
+            return False
+        if claimed:
+            return True
+        # First run ever: create the lease document; losers of the race hit the duplicate key
+        if StatsModel.collection.find_one({"_id": _RECONCILE_LEASE_ID}, {"_id": 1}):
+            return False
+        try:
+            StatsModel.collection.insert_one(
+                {"_id": _RECONCILE_LEASE_ID, "leaseUntil": now + timedelta(seconds=interval_seconds)}
+            )
+            return True
+        except Exception:
+            return False
+
+
+class StatsReconciler:
+    """Background thread running StatsModel.reconcile() every STATS_RECONCILE_SECONDS in one worker at a time."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            # A thread started before fork does not exist in the child
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="stats-reconciler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if StatsModel.claim_reconcile(self.interval):
+                    corrections = StatsModel.reconcile()
+                    if corrections:
+                        print(f"✅ Stats reconcile corrected {corrections} counter(s)")
+            except Exception as e:
+                print(f"❌ Stats reconcile failed: {e}")
+
+
+stats_reconciler = StatsReconciler(Config.STATS_RECONCILE_SECONDS)
@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+from db import db
+from config import Config
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+
+class SyncModel:
+    """
+    Change tracking for delta sync.
+    Every bus/schedule write stamps the document with a 'syncSeq' taken from a
+    global monotonic counter, and every delete leaves a tombstone with its own
+    'syncSeq'. Clients then ask for everything with a sequence above the last
+    one they saw.
+    """
+    counters = db.counters
+    tombstones = db.tombstones
+    COUNTER_ID = "syncSeq"
+
+    @staticmethod
+    def next_seq(count=1):
+        """Reserves 'count' sequence numbers and returns the highest one."""
+        counter = SyncModel.counters.find_one_and_update(
+            {"_id": SyncModel.COUNTER_ID},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["value"]
+
+    @staticmethod
+    def current_seq():
+        counter = SyncModel.counters.find_one({"_id": SyncModel.COUNTER_ID})
+        return counter["value"] if counter else 0
+
+    @staticmethod
+    def record_deletes(kind, doc_ids):
+        """Writes one tombstone per deleted document ('kind' is 'bus' or 'schedule')."""
+        if not doc_ids:
+            return
+        last = SyncModel.next_seq(len(doc_ids))
+        first = last - len(doc_ids) + 1
+        now = datetime.utcnow()
+        SyncModel.tombstones.insert_many([
+            {"kind": kind, "docId": doc_id, "syncSeq": first + i, "deletedAt": now}
+            for i, doc_id in enumerate(doc_ids)
+        ], ordered=False)
+
+    # --- Tokens ---
+    @staticmethod
+    def encode_token(seq, lookback=False):
+        """
+        'seq' is the head the client has seen. A token with 'lookback' makes the
+        next call also re-send changes stamped within SYNC_GRACE_SECONDS before
+        it was issued (see changes_since); continuation pages do not need it.
+        """
+        token = f"{seq}-{int(time.time())}"
+        return f"{token}-r" if lookback else token
+
+    @staticmethod
+    def decode_token(token):
+        """Returns (seq, lookback_from, issued_at) or raises ValueError for a malformed token."""
+        if not token or token == "0":
+            return 0, None, None
+        parts = token.split("-")
+        if len(parts) not in (2, 3):
+            raise ValueError("malformed token")
+        seq, issued_at = int(parts[0]), int(parts[1])
+        lookback_from = None
+        if len(parts) == 3 and parts[2] == "r":
+            lookback_from = datetime.utcfromtimestamp(issued_at) - timedelta(seconds=Config.SYNC_GRACE_SECONDS)
+        return seq, lookback_from, issued_at
+
+    @staticmethod
+    def token_expired(issued_at):
+        """Tokens older than the tombstone retention could miss deletes."""
+        if issued_at is None:
+            return False
+        return time.time() - issued_at > Config.SYNC_TOMBSTONE_TTL_DAYS * 86400
+
+    # --- Queries ---
+    @staticmethod
+    def changes_since(since, limit, lookback_from=None):
+        """
+        Returns buses, schedules and tombstones with syncSeq > since, at most
+        'limit' of each. When any list is truncated, everything is cut back to
+        the smallest truncation point so the returned token never skips a change.
+
+        A writer stamps updatedAt and reserves its syncSeq before its write
+        lands, so a slow write can show up below a head already handed out.
+        With 'lookback_from' (a time SYNC_GRACE_SECONDS before the previous
+        token was issued), documents at or below 'since' stamped after it are
+        sent again; clients apply changes by _id, so a repeat is harmless.
+        """
+        try:
+            head = SyncModel.current_seq()
+            query = {"syncSeq": {"$gt": since}}
+            sources = {
+                "buses": db.buses_data.find(query, {"routeGeometry": 0}).sort("syncSeq", ASCENDING).limit(limit),
+                "schedules": db.schedules.find(query).sort("syncSeq", ASCENDING).limit(limit),
+                "tombstones": SyncModel.tombstones.find(query).sort("syncSeq", ASCENDING).limit(limit),
+            }
+            results = {name: list(cursor) for name, cursor in sources.items()}
+
+            truncated = [docs[-1]["syncSeq"] for docs in results.values() if len(docs) == limit]
+            upto = min(truncated) if truncated else head
+            if truncated:
+                results = {
+                    name: [doc for doc in docs if doc["syncSeq"] <= upto]
+                    for name, docs in results.items()
+                }
+
+            if lookback_from is not None:
+                recent = {"syncSeq": {"$lte": since}}
+                late = {
+                    "buses": db.buses_data.find({**recent, "updatedAt": {"$gte": lookback_from}}, {"routeGeometry": 0}),
+                    "schedules": db.schedules.find({**recent, "updatedAt": {"$gte": lookback_from}}),
+                    "tombstones": SyncModel.tombstones.find({**recent, "deletedAt": {"$gte": lookback_from}}),
+                }
+                results = {name: list(late[name].sort("syncSeq", ASCENDING)) + docs for name, docs in results.items()}
+            return results, max(upto, since), bool(truncated)
+        except Exception as e:
+            raise Exception(f"Error fetching changes: {str(e)}")
+
+    # --- Maintenance ---
+    @staticmethod
+    def ensure_indexes():
+        db.buses_data.create_index([("syncSeq", ASCENDING)])
+        db.schedules.create_index([("syncSeq", ASCENDING)])
+        # The sync lookback reads recently stamped documents
+        db.buses_data.create_index([("updatedAt", ASCENDING)])
+        db.schedules.create_index([("updatedAt", ASCENDING)])
+        SyncModel.tombstones.create_index([("syncSeq", ASCENDING)])
+        SyncModel.tombstones.create_index(
+            [("deletedAt", ASCENDING)],
+            expireAfterSeconds=Config.SYNC_TOMBSTONE_TTL_DAYS * 86400
+        )
+        SyncModel.backfill()
+
+    @staticmethod
+    def backfill():
+        """Stamps documents written before delta sync existed with a sequence number."""
+        for collection in (db.buses_data, db.schedules):
+            ids = [doc["_id"] for doc in collection.find({"syncSeq": {"$exists": False}}, {"_id": 1})]
+            if not ids:
+                continue
+            last = SyncModel.next_seq(len(ids))
+            first = last - len(ids) + 1
+            collection.bulk_write(
+                [UpdateOne({"_id": _id}, {"$set": {"syncSeq": first + i}}) for i, _id in enumerate(ids)],
+                ordered=False
+            )
@@ -2,6 +2,18 @@ from datetime import datetime
 from db import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId # Import ObjectId
+from config import Config
+from utils.write_behind import WriteBehindBuffer
+from models.stats_model import StatsModel, TRACKED_FIELDS, apply_set
+
+# lastLogin and activity counters are written in batches, off the request path
+user_activity = WriteBehindBuffer(
+    db.users,
+    flush_interval=Config.USER_ACTIVITY_FLUSH_SECONDS,
+    max_pending=Config.USER_ACTIVITY_MAX_PENDING,
+    name="user-activity",
+    max_retries=Config.USER_ACTIVITY_MAX_RETRIES
+)
 
 class UserModel:
     @staticmethod
@@ -25,6 +37,7 @@ class UserModel:
         
         # insert_one returns an InsertOneResult object containing the new _id
         result = db.users.insert_one(user_data)
+        StatsModel.record_user(None, user_data)
         
         # Return the user document by finding it with the new _id
         return UserModel.find_by_id(result.inserted_id)
@@ -45,10 +58,13 @@ class UserModel:
         """Update user details using their _id and return the updated document."""
         update_data["updatedAt"] = datetime.utcnow()
         
-        db.users.update_one(
+        before = db.users.find_one_and_update(
             {"_id": ObjectId(user_id)}, 
-            {"$set": update_data}
+            {"$set": update_data},
+            projection=TRACKED_FIELDS["user"]
         )
+        if before is not None:
+            StatsModel.record_user(before, apply_set(before, update_data))
         
         # Fetch and return the newly updated user document
         return UserModel.find_by_id(user_id)
@@ -56,4 +72,20 @@ class UserModel:
     @staticmethod
     def check_password(hashed_password, password):
         """Verify a password against its hash."""
-        return check_password_hash(hashed_password, password)
\ No newline at end of file
+        return check_password_hash(hashed_password, password)
+
+    @staticmethod
+    def record_login(user_id):
+        """Queue the lastLogin timestamp; flushed in the next user-activity batch."""
+        # $max, not $set: every worker flushes its own buffer, so an older batch can land last
+        user_activity.update(ObjectId(user_id), max_fields={"lastLogin": datetime.utcnow()})
+
+    @staticmethod
+    def record_booking(user_id, amount):
+        """Queue increments of the user's totalBookings/totalSpent counters."""
+        user_activity.update(ObjectId(user_id), inc_fields={"totalBookings": 1, "totalSpent": amount})
+
+    @staticmethod
+    def record_cancellation(user_id, amount):
+        """Queue the reverse of record_booking for a cancelled booking."""
+        user_activity.update(ObjectId(user_id), inc_fields={"totalBookings": -1, "totalSpent": -amount})
@@ -6,6 +6,8 @@ from datetime import datetime
 from utils.jwt_utils import generate_token, verify_token
 from utils.json_encoder import serialize_doc
 from db import db
+from models.user_model import UserModel
+from models.stats_model import StatsModel, TRACKED_FIELDS, apply_set
 from bson import ObjectId
 from functools import wraps
 
@@ -71,6 +73,7 @@ def register():
         }
 
         result = db.users.insert_one(new_user)
+        StatsModel.record_user(None, new_user)
         # Prepare response object (don't send back password hash)
         user_for_response = {k: v for k, v in new_user.items() if k != "passwordHash"}
         user_for_response["_id"] = str(result.inserted_id)
@@ -98,8 +101,8 @@ def login():
         if not user or not check_password_hash(user["passwordHash"], password):
             return jsonify({"error": "Invalid email or password"}), 401
 
-        # Update the lastLogin timestamp on successful login
-        db.users.update_one({"_id": user["_id"]}, {"$set": {"lastLogin": datetime.utcnow()}})
+        # Queue the lastLogin update; it is written in the next batch flush
+        UserModel.record_login(user["_id"])
         
         token = generate_token(str(user["_id"]), user.get("role", "USER"))
         
@@ -228,6 +231,7 @@ def create_user_by_admin():
             "totalSpent": 0,
         }
         result = db.users.insert_one(new_user)
+        StatsModel.record_user(None, new_user)
         new_user.pop("passwordHash", None)
         new_user["_id"] = str(result.inserted_id)
         
@@ -249,7 +253,11 @@ def update_user_by_admin(user_id):
         if "role" in data: update_fields["role"] = data["role"].upper()
         if "status" in data: update_fields["status"] = data["status"].upper()
         
-        db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_fields})
+        before = db.users.find_one_and_update(
+            {"_id": ObjectId(user_id)}, {"$set": update_fields}, projection=TRACKED_FIELDS["user"]
+        )
+        if before is not None:
+            StatsModel.record_user(before, apply_set(before, update_fields))
         updated_user = db.users.find_one({"_id": ObjectId(user_id)}, {"passwordHash": 0})
         
         return jsonify(serialize_doc(updated_user)), 200
@@ -261,9 +269,10 @@ def update_user_by_admin(user_id):
 def delete_user_by_admin(user_id):
     """[ADMIN] Deletes a specific user."""
     try:
-        result = db.users.delete_one({"_id": ObjectId(user_id)})
-        if result.deleted_count == 0:
+        deleted = db.users.find_one_and_delete({"_id": ObjectId(user_id)}, projection=TRACKED_FIELDS["user"])
+        if deleted is None:
             return jsonify({"error": "User not found"}), 404
+        StatsModel.record_user(deleted, None)
             
         return jsonify({"message": "User deleted successfully"}), 200
     except Exception as e:
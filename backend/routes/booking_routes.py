@@ -0,0 +1,83 @@
+from flask import Blueprint, request, jsonify
+from models.booking_model import BookingModel, BookingError
+from routes.bus_routes import auth_required
+from utils.json_encoder import serialize_doc
+
+booking_bp = Blueprint("bookings", __name__)
+
+
+# [GET] Free seats per stop segment for a trip (schedule on a date)
+@booking_bp.route("/trips/<schedule_id>", methods=["GET"])
+@auth_required()
+def get_trip_availability(schedule_id):
+    try:
+        availability = BookingModel.get_availability(schedule_id, request.args.get("date"))
+        return jsonify(availability), 200
+    except BookingError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# [POST] Hold seats between two stops of a trip
+@booking_bp.route("/holds", methods=["POST"])
+@auth_required()
+def create_hold():
+    try:
+        data = request.get_json() or {}
+        required = ["scheduleId", "date", "fromIndex", "toIndex"]
+        missing = [key for key in required if key not in data]
+        if missing:
+            return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
+
+        hold = BookingModel.create_hold(
+            user_id=request.user["user_id"],
+            schedule_id=data["scheduleId"],
+            service_date=data["date"],
+            from_index=data["fromIndex"],
+            to_index=data["toIndex"],
+            seats=data.get("seats", 1)
+        )
+        return jsonify({"message": "Seats held ✅", "hold": serialize_doc(hold)}), 201
+    except BookingError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# [POST] Confirm a hold before it expires
+@booking_bp.route("/holds/<hold_id>/confirm", methods=["POST"])
+@auth_required()
+def confirm_hold(hold_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        booking = BookingModel.confirm_hold(hold_id, request.user["user_id"], data.get("amount"))
+        return jsonify({"message": "Booking confirmed ✅", "booking": serialize_doc(booking)}), 200
+    except BookingError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# [DELETE] Release a hold or cancel a booking
+@booking_bp.route("/holds/<hold_id>", methods=["DELETE"])
+@auth_required()
+def cancel_hold(hold_id):
+    try:
+        BookingModel.cancel(hold_id, request.user["user_id"])
+        return jsonify({"message": "Seats released ✅"}), 200
+    except BookingError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# [GET] The current user's holds and bookings, newest first
+@booking_bp.route("/", methods=["GET"])
+@auth_required()
+def get_my_bookings():
+    try:
+        bookings = BookingModel.get_user_bookings(request.user["user_id"])
+        return jsonify({"bookings": [serialize_doc(b) for b in bookings]}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
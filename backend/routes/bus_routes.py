@@ -3,6 +3,7 @@ from models.bus_model import BusModel
 from models.schedule_model import ScheduleModel
 from utils.jwt_utils import verify_token
 from utils.json_encoder import serialize_doc
+from utils.timetable_snapshot import timetable
 from functools import wraps
 
 bus_bp = Blueprint("buses", __name__)
@@ -78,6 +79,18 @@ def get_buses():
         source = request.args.get("source")
         destination = request.args.get("destination")
 
+        # Catalog and search lookups come from the shared timetable snapshot when one is compiled
+        snapshot = timetable.get() if mode in ("cities", "stops", "search") else None
+        if snapshot is not None:
+            if mode == "cities":
+                return jsonify({"cities": snapshot.cities()}), 200
+            if mode == "stops":
+                return jsonify({"stops": snapshot.stops()}), 200
+            if mode == "search" and source and destination:
+                bus_ids = snapshot.search(source, destination)
+                buses = BusModel.get_buses_by_ids(bus_ids) if bus_ids else []
+                return jsonify({"buses": [serialize_doc(bus) for bus in buses]}), 200
+
         buses = BusModel.get_all_buses()
         buses = [serialize_doc(bus) for bus in buses]
 
@@ -142,6 +155,36 @@ def update_bus(bus_id):
         return jsonify({"error": str(e)}), 500
 
 
+# Report a GPS fix; it is snapped to the route and stored with its progress — ADMIN ONLY
+@bus_bp.route("/<bus_id>/location", methods=["PUT"])
+@auth_required(admin_only=True)
+def update_location(bus_id):
+    try:
+        data = request.get_json() or {}
+        if "lat" not in data or "lng" not in data:
+            return jsonify({"error": "Missing fields: lat, lng"}), 400
+
+        location = BusModel.update_location(bus_id, data)
+        if location is None:
+            return jsonify({"error": "Bus not found"}), 404
+        return jsonify({"message": "Location updated ✅", "currentLocation": serialize_doc(location)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Progress of a bus along its route (distance travelled, next stop, off-route flag)
+@bus_bp.route("/<bus_id>/progress", methods=["GET"])
+@auth_required()
+def get_progress(bus_id):
+    try:
+        bus = BusModel.get_progress(bus_id)
+        if not bus:
+            return jsonify({"error": "Bus not found"}), 404
+        return jsonify({"progress": serialize_doc(bus)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # Delete bus — ADMIN ONLY
 @bus_bp.route("/<bus_id>", methods=["DELETE"])
 @auth_required(admin_only=True)
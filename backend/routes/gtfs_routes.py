@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+from flask import Blueprint, request, jsonify, Response
+from routes.bus_routes import auth_required
+from utils.gtfs import export_feed, import_feed, GtfsError
+
+gtfs_bp = Blueprint("gtfs", __name__)
+
+# [GET] The whole network as a GTFS static feed, streamed as it is built
+@gtfs_bp.route("/feed.zip", methods=["GET"])
+@auth_required()
+def get_feed():
+    try:
+        return Response(
+            export_feed(),
+            mimetype="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="mybus-gtfs.zip"'}
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# [POST] Import a GTFS zip (multipart field 'feed' or the raw body) — ADMIN ONLY
+@gtfs_bp.route("/import", methods=["POST"])
+@auth_required(admin_only=True)
+def post_feed():
+    try:
+        upload = request.files.get("feed")
+        stream = upload.stream if upload else request.stream
+        if not upload:
+            # zipfile needs to seek; spool the raw body to a temporary file
+            spooled = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+            shutil.copyfileobj(stream, spooled)
+            spooled.seek(0)
+            stream = spooled
+        counts = import_feed(stream)
+        return jsonify({"message": "GTFS feed imported ✅", **counts}), 200
+    except GtfsError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,150 @@
+from flask import Blueprint, request, jsonify, Response
+from routes.bus_routes import auth_required
+from utils.profiler import profile_store
+from utils.compression import compression_stats
+from utils.cache import read_cache
+from models.user_model import user_activity
+from models.stats_model import StatsModel
+from utils.fleet_monitor import fleet_monitor
+
+# Admin-only operational endpoints (profiling, diagnostics)
+ops_bp = Blueprint("ops", __name__)
+
+# ============================================
+# == DASHBOARD STATS ==
+# ============================================
+
+# [GET] Bus and user counts by status, category, type, city and role — ADMIN ONLY
+@ops_bp.route("/stats", methods=["GET"])
+@auth_required(admin_only=True)
+def get_stats():
+    try:
+        return jsonify(StatsModel.get_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# [POST] Recount from the collections now and fix drifted counters — ADMIN ONLY
+@ops_bp.route("/stats/reconcile", methods=["POST"])
+@auth_required(admin_only=True)
+def reconcile_stats():
+    try:
+        corrections = StatsModel.reconcile()
+        return jsonify({"message": "Stats reconciled ✅", "corrections": corrections}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ============================================
+# == FLEET ALERTS ==
+# ============================================
+
+# [GET] Open stale-device / off-route / bunching alerts (?kind=stale|offRoute|bunching) — ADMIN ONLY
+@ops_bp.route("/alerts", methods=["GET"])
+@auth_required(admin_only=True)
+def get_alerts():
+    try:
+        kind = request.args.get("kind")
+        if kind and kind not in fleet_monitor.raised:
+            return jsonify({"error": "kind must be one of: stale, offRoute, bunching"}), 400
+        return jsonify({"alerts": fleet_monitor.get_alerts(kind), **fleet_monitor.stats()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ============================================
+# == REQUEST PROFILES ==
+# ============================================
+
+# [GET] List stored request profiles, newest first — ADMIN ONLY
+@ops_bp.route("/profiles", methods=["GET"])
+@auth_required(admin_only=True)
+def list_profiles():
+    try:
+        return jsonify({"profiles": profile_store.list()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# [GET] Fetch one profile as speedscope JSON (default) or collapsed stacks — ADMIN ONLY
+@ops_bp.route("/profiles/<profile_id>", methods=["GET"])
+@auth_required(admin_only=True)
+def get_profile(profile_id):
+    try:
+        profile = profile_store.get(profile_id)
+        if not profile:
+            return jsonify({"error": "Profile not found"}), 404
+
+        fmt = request.args.get("format", "speedscope")
+        if fmt == "collapsed":
+            return Response(profile.to_collapsed(), mimetype="text/plain"), 200
+        if fmt == "speedscope":
+            return jsonify(profile.to_speedscope()), 200
+        return jsonify({"error": "format must be 'speedscope' or 'collapsed'"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# [DELETE] Drop all stored profiles — ADMIN ONLY
+@ops_bp.route("/profiles", methods=["DELETE"])
+@auth_required(admin_only=True)
+def clear_profiles():
+    try:
+        profile_store.clear()
+        return jsonify({"message": "Profiles cleared ✅"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ============================================
+# == RESPONSE COMPRESSION ==
+# ============================================
+
+# [GET] Bandwidth saved and compressed-body cache stats — ADMIN ONLY
+@ops_bp.route("/compression", methods=["GET"])
+@auth_required(admin_only=True)
+def get_compression_stats():
+    try:
+        return jsonify(compression_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ============================================
+# == READ-THROUGH CACHE ==
+# ============================================
+
+# [GET] Hit/miss counters of the bus/schedule lookup cache in this worker — ADMIN ONLY
+@ops_bp.route("/cache", methods=["GET"])
+@auth_required(admin_only=True)
+def get_cache_stats():
+    try:
+        return jsonify(read_cache.stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# [DELETE] Drop every cached lookup — ADMIN ONLY
+@ops_bp.route("/cache", methods=["DELETE"])
+@auth_required(admin_only=True)
+def clear_cache():
+    try:
+        read_cache.clear()
+        return jsonify({"message": "Cache cleared ✅"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ============================================
+# == WRITE-BEHIND BUFFERS ==
+# ============================================
+
+# [GET] Pending and flushed counts for buffered user activity writes — ADMIN ONLY
+@ops_bp.route("/write-behind", methods=["GET"])
+@auth_required(admin_only=True)
+def get_write_behind_stats():
+    try:
+        return jsonify({"buffers": [user_activity.stats()]}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# [POST] Flush buffered writes now — ADMIN ONLY
+@ops_bp.route("/write-behind/flush", methods=["POST"])
+@auth_required(admin_only=True)
+def flush_write_behind():
+    try:
+        flushed = user_activity.flush()
+        return jsonify({"message": "Flushed ✅", "documents": flushed}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from models.schedule_model import ScheduleModel
 from utils.jwt_utils import verify_token
 from utils.json_encoder import serialize_doc
@@ -66,6 +66,10 @@ def get_schedules():
     try:
         bus_id = request.args.get("busId")
         if bus_id:
+            # Served straight from the shared timetable snapshot while it is current
+            body = ScheduleModel.get_snapshot_schedules(bus_id)
+            if body is not None:
+                return Response(body, status=200, mimetype="application/json")
             schedules = ScheduleModel.get_schedules_by_bus_id(bus_id)
         else:
             schedules = ScheduleModel.get_all_schedules()
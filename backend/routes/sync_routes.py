@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify
+from models.sync_model import SyncModel
+from routes.bus_routes import auth_required
+from utils.json_encoder import serialize_doc
+from config import Config
+
+sync_bp = Blueprint("sync", __name__)
+
+# [GET] Buses and schedules changed or deleted since a sync token
+@sync_bp.route("/", methods=["GET"])
+@auth_required()
+def get_changes():
+    """
+    Delta sync for mobile/offline clients.
+    Call with no 'since' for a full snapshot, then pass back the returned
+    'token'. When 'hasMore' is true, call again straight away with the new token.
+    A change may be sent twice; apply changes by _id.
+    If 'reset' is true the token is too old and the client must resync from scratch.
+    """
+    try:
+        try:
+            since, lookback_from, issued_at = SyncModel.decode_token(request.args.get("since"))
+            limit = min(int(request.args.get("limit", Config.SYNC_PAGE_SIZE)), Config.SYNC_PAGE_SIZE)
+        except ValueError:
+            return jsonify({"error": "Invalid 'since' token or 'limit'"}), 400
+        if limit <= 0:
+            return jsonify({"error": "'limit' must be positive"}), 400
+
+        if SyncModel.token_expired(issued_at):
+            return jsonify({"reset": True, "token": SyncModel.encode_token(0)}), 200
+
+        changes, upto, has_more = SyncModel.changes_since(since, limit, lookback_from)
+        deleted = {"buses": [], "schedules": []}
+        for tombstone in changes["tombstones"]:
+            key = "buses" if tombstone["kind"] == "bus" else "schedules"
+            deleted[key].append(str(tombstone["docId"]))
+
+        return jsonify({
+            "buses": [serialize_doc(bus) for bus in changes["buses"]],
+            "schedules": [serialize_doc(s) for s in changes["schedules"]],
+            "deleted": deleted,
+            "token": SyncModel.encode_token(upto, lookback=not has_more),
+            "hasMore": has_more,
+            "reset": False
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,253 @@
+"""
+Read-through cache for hot single-document lookups.
+
+Models wrap their by-id reads in `read_cache.get_or_load(key, loader)` and call
+`read_cache.invalidate(...)` from every write that changes those documents.
+Two backends are available through CACHE_BACKEND:
+
+- "memory" (default): a per-process LRU bounded by CACHE_MAX_ENTRIES with a
+  CACHE_TTL_SECONDS expiry. Invalidation is exact within a process; other
+  worker processes see a change at most CACHE_TTL_SECONDS later.
+- "redis": one store shared by every worker (CACHE_REDIS_URL), so an
+  invalidation is seen everywhere at once. `fakeredis://` selects the
+  in-process fakeredis stand-in.
+
+A load that races a write must not store what it read before the write. On a
+miss the loader first claims a per-key load token (SET NX in Redis); an
+invalidation of that key deletes the token, and the loaded value is only
+stored while the token is still in place. Invalidating one key never discards
+loads of other keys.
+"""
+import copy
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from config import Config
+
+_MISSING = object()
+
+
+class MemoryCache:
+    """Thread-safe LRU with per-entry TTL."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._loading = {}  # key -> token of the load allowed to store it
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                self.expirations += 1
+                return _MISSING
+            self._items.move_to_end(key)
+        # Callers may mutate what they get back, so hand out a copy
+        return copy.deepcopy(value)
+
+    def claim(self, key):
+        """Returns a load token for 'key', or None when another load of it is in flight."""
+        token = object()
+        with self._lock:
+            if key in self._loading:
+                return None
+            self._loading[key] = token
+        return token
+
+    def set_if_claimed(self, key, token, value):
+        """Stores 'value' unless 'key' was invalidated since claim(); always releases the token."""
+        value = copy.deepcopy(value)
+        with self._lock:
+            if self._loading.get(key) is not token:
+                return False
+            del self._loading[key]
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def release(self, key, token):
+        with self._lock:
+            if self._loading.get(key) is token:
+                del self._loading[key]
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+                self._loading.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._loading.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._items)
+        return {"backend": "memory", "entries": size, "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl, "evictions": self.evictions, "expirations": self.expirations}
+
+
+class RedisCache:
+    """Shared backend; eviction is left to Redis (TTL per key plus its maxmemory policy)."""
+
+    def __init__(self, url, ttl, prefix="mybus:cache:"):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self.client = fakeredis.FakeRedis()
+        else:
+            import redis
+            self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def _token_key(self, key):
+        return self.prefix + "load:" + key
+
+    def claim(self, key):
+        # Expires on its own if the loading process dies before storing
+        token = uuid.uuid4().hex.encode()
+        if self.client.set(self._token_key(key), token, nx=True, ex=max(1, int(self.ttl))):
+            return token
+        return None
+
+    def set_if_claimed(self, key, token, value):
+        from redis.exceptions import WatchError
+        token_key = self._token_key(key)
+        with self.client.pipeline() as pipe:
+            try:
+                # An invalidation deletes the token, which aborts the transaction
+                pipe.watch(token_key)
+                if pipe.get(token_key) != token:
+                    return False
+                pipe.multi()
+                pipe.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(self.ttl)))
+                pipe.delete(token_key)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def release(self, key, token):
+        token_key = self._token_key(key)
+        if self.client.get(token_key) == token:
+            self.client.delete(token_key)
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys], *[self._token_key(key) for key in keys])
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self):
+        return {"backend": "redis", "ttlSeconds": self.ttl}
+
+
+class ReadThroughCache:
+    """Cache-aside facade with hit/miss counters shared by all backends."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for 'key', or calls loader() and caches a non-None result."""
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            return loader()
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        try:
+            token = self.backend.claim(key)
+        except Exception:
+            self.errors += 1
+            token = None
+        if token is None:
+            # Another load of this key is in flight (or the store is down): read, don't store
+            return loader()
+        try:
+            value = loader()
+        except Exception:
+            self._release(key, token)
+            raise
+        try:
+            if value is None:
+                self.backend.release(key, token)
+            else:
+                self.backend.set_if_claimed(key, token, value)
+        except Exception:
+            self.errors += 1
+        return value
+
+    def _release(self, key, token):
+        try:
+            self.backend.release(key, token)
+        except Exception:
+            self.errors += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self.invalidations += len(keys)
+        try:
+            self.backend.delete(keys)
+        except Exception:
+            self.errors += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def reset(self):
+        """Per-worker reset after fork: drops inherited in-process entries and counters, never a shared store."""
+        if isinstance(self.backend, MemoryCache):
+            self.backend.clear()
+        self.hits = self.misses = self.invalidations = self.errors = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            **self.backend.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def _make_backend():
+    if not Config.CACHE_ENABLED:
+        return MemoryCache(max_entries=0, ttl=0)
+    if Config.CACHE_BACKEND == "redis":
+        return RedisCache(Config.CACHE_REDIS_URL, Config.CACHE_TTL_SECONDS)
+    return MemoryCache(Config.CACHE_MAX_ENTRIES, Config.CACHE_TTL_SECONDS)
+
+
+read_cache = ReadThroughCache(_make_backend())
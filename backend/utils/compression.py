@@ -0,0 +1,150 @@
+"""
+Negotiated gzip/brotli compression for JSON responses.
+
+Responses above COMPRESS_MIN_SIZE are compressed with the best encoding the
+client accepts (brotli when the `brotli` package is installed, else gzip).
+For GET requests under COMPRESS_CACHE_PATHS the compressed body is cached by a
+digest of the uncompressed payload, so an unchanged bus list, stop catalog or
+bus schedule is compressed once and then served from memory. The digest also
+doubles as a weak ETag, letting clients revalidate with If-None-Match.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (encoding, payload digest), bounded in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._size,
+                    "maxBytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+compressed_cache = CompressedBodyCache(Config.COMPRESS_CACHE_MAX_BYTES)
+
+# Running totals so bandwidth savings can be read off /admin/compression
+_totals_lock = threading.Lock()
+_totals = {"responses": 0, "bytesIn": 0, "bytesOut": 0, "notModified": 0}
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=Config.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=Config.COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _choose_encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def _is_cacheable():
+    return request.method == "GET" and any(
+        request.path.startswith(prefix) for prefix in Config.COMPRESS_CACHE_PATHS
+    )
+
+
+def compression_stats():
+    with _totals_lock:
+        totals = dict(_totals)
+    saved = totals["bytesIn"] - totals["bytesOut"]
+    totals["ratio"] = round(totals["bytesOut"] / totals["bytesIn"], 4) if totals["bytesIn"] else None
+    totals["bytesSaved"] = saved
+    totals["brotliAvailable"] = brotli is not None
+    totals["minSize"] = Config.COMPRESS_MIN_SIZE
+    totals["cache"] = compressed_cache.stats()
+    return totals
+
+
+def init_compression(app):
+    """Registers the response compression hook on a Flask app."""
+
+    @app.after_request
+    def _compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.status_code != 200
+            or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        body = response.get_data()
+        if len(body) < Config.COMPRESS_MIN_SIZE:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        cacheable = _is_cacheable()
+        digest = None
+        if cacheable:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            response.set_etag(digest, weak=True)
+            if request.if_none_match.contains_weak(digest):
+                with _totals_lock:
+                    _totals["notModified"] += 1
+                response.status_code = 304
+                response.set_data(b"")
+                return response
+
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+
+        compressed = compressed_cache.get((encoding, digest)) if cacheable else None
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if cacheable:
+                compressed_cache.put((encoding, digest), compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        with _totals_lock:
+            _totals["responses"] += 1
+            _totals["bytesIn"] += len(body)
+            _totals["bytesOut"] += len(compressed)
+        return response
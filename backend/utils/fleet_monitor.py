@@ -0,0 +1,275 @@
+"""
+Streaming stale-device, off-route and bunching detector.
+
+Each process keeps one slot per bus in a few numpy arrays: time of the last
+GPS fix, offset from the route, distance along it, a route key and whether the
+bus is ACTIVE. BusModel feeds every write it makes straight into the arrays;
+writes made by other workers are picked up each tick by reading only the bus
+documents whose syncSeq moved since the last tick (plus bus tombstones), so
+the collection is scanned once, at bootstrap, and never again.
+
+Every FLEET_TICK_SECONDS all buses are checked at once with vectorized
+operations:
+
+- stale     ACTIVE bus with no fix for FLEET_STALE_SECONDS (or none at all)
+- offRoute  fresh fix more than OFF_ROUTE_METERS from the route
+- bunching  two fresh buses on the same route (same route name and city)
+            closer than FLEET_BUNCHING_METERS along it
+"""
+import os
+import threading
+import time
+from datetime import timezone
+import numpy as np
+from db import db
+from config import Config
+from models.sync_model import SyncModel
+
+PROJECTION = {
+    "busNumber": 1, "status": 1, "route.name": 1, "route.city": 1, "syncSeq": 1,
+    "currentLocation.recordedAt": 1, "currentLocation.offsetMeters": 1,
+    "currentLocation.distanceAlongRoute": 1,
+}
+
+
+def _epoch(value):
+    """Naive-UTC datetime (as stored) -> epoch seconds, or NaN."""
+    if value is None or not hasattr(value, "timestamp"):
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class FleetMonitor:
+    def __init__(self, tick_seconds, stale_seconds, bunching_meters, initial_slots=1024):
+        self.tick_seconds = tick_seconds
+        self.stale_seconds = stale_seconds
+        self.bunching_meters = bunching_meters
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._allocate(initial_slots)
+
+    def _allocate(self, size):
+        self._slots = {}         # bus id (str) -> slot
+        self._free = []          # slots of deleted buses, reused first
+        self._bus_ids = [None] * size
+        self._bus_numbers = [None] * size
+        self._routes = {}        # (route name, city) -> route key
+        self.last_fix = np.full(size, np.nan)
+        self.offset = np.full(size, np.nan, dtype=np.float32)
+        self.along = np.full(size, np.nan, dtype=np.float32)
+        self.route = np.full(size, -1, dtype=np.int32)
+        self.active = np.zeros(size, dtype=bool)
+        self.used = np.zeros(size, dtype=bool)
+        self._next_slot = 0
+        self._since = 0
+        self._prev_head = 0
+        self.alerts = {}         # (kind, bus id) -> alert
+        self.raised = {"stale": 0, "offRoute": 0, "bunching": 0}
+        self.tick_at = None
+        self.tick_ms = None
+        self.bootstrapped = False
+
+    def _grow(self):
+        size = len(self.used)
+        extra = size
+        self.last_fix = np.concatenate((self.last_fix, np.full(extra, np.nan)))
+        self.offset = np.concatenate((self.offset, np.full(extra, np.nan, dtype=np.float32)))
+        self.along = np.concatenate((self.along, np.full(extra, np.nan, dtype=np.float32)))
+        self.route = np.concatenate((self.route, np.full(extra, -1, dtype=np.int32)))
+        self.active = np.concatenate((self.active, np.zeros(extra, dtype=bool)))
+        self.used = np.concatenate((self.used, np.zeros(extra, dtype=bool)))
+        self._bus_ids.extend([None] * extra)
+        self._bus_numbers.extend([None] * extra)
+
+    def _slot(self, bus_id):
+        slot = self._slots.get(bus_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self._next_slot == len(self.used):
+                    self._grow()
+                slot = self._next_slot
+                self._next_slot += 1
+            self._slots[bus_id] = slot
+            self._bus_ids[slot] = bus_id
+            self.used[slot] = True
+        return slot
+
+    def _route_key(self, route):
+        key = ((route or {}).get("name"), (route or {}).get("city"))
+        if key[0] is None:
+            return -1
+        return self._routes.setdefault(key, len(self._routes))
+
+    # --- Updates ---
+    def observe(self, bus_id, fields):
+        """
+        Applies a bus write ('fields' is the inserted document or the $set
+        document) to the arrays. Fields not in it keep their values.
+        """
+        bus_id = str(bus_id)
+        with self._lock:
+            slot = self._slot(bus_id)
+            if "busNumber" in fields:
+                self._bus_numbers[slot] = fields["busNumber"]
+            if "status" in fields:
+                self.active[slot] = fields["status"] == "ACTIVE"
+            if "route" in fields:
+                self.route[slot] = self._route_key(fields["route"])
+            location = fields.get("currentLocation")
+            if location:
+                self.last_fix[slot] = _epoch(location.get("recordedAt"))
+                self.offset[slot] = _number(location.get("offsetMeters"))
+                self.along[slot] = _number(location.get("distanceAlongRoute"))
+
+    def forget(self, bus_id):
+        bus_id = str(bus_id)
+        with self._lock:
+            slot = self._slots.pop(bus_id, None)
+            if slot is None:
+                return
+            self.used[slot] = self.active[slot] = False
+            self.last_fix[slot] = self.offset[slot] = self.along[slot] = np.nan
+            self.route[slot] = -1
+            self._bus_ids[slot] = self._bus_numbers[slot] = None
+            self._free.append(slot)
+
+    def bootstrap(self):
+        """Loads every bus once; later changes arrive through observe() and catch_up()."""
+        head = SyncModel.current_seq()
+        for bus in db.buses_data.find({}, PROJECTION, batch_size=5000):
+            self.observe(bus["_id"], bus)
+        self._since = self._prev_head = head
+        self.bootstrapped = True
+
+    def catch_up(self):
+        """
+        Applies bus writes and deletes made by any process since the last tick.
+        Each tick re-reads from the head seen one tick earlier, so a write that
+        reserved its syncSeq before the previous read but landed after it is
+        still seen.
+        """
+        head = SyncModel.current_seq()
+        since = self._since
+        for bus in db.buses_data.find({"syncSeq": {"$gt": since}}, PROJECTION):
+            self.observe(bus["_id"], bus)
+        for tombstone in SyncModel.tombstones.find({"kind": "bus", "syncSeq": {"$gt": since}}, {"docId": 1}):
+            self.forget(tombstone["docId"])
+        self._since, self._prev_head = self._prev_head, head
+
+    # --- Detection ---
+    def check(self, now=None):
+        """Evaluates every bus at once and refreshes self.alerts; returns the current alerts."""
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        with self._lock:
+            n = self._next_slot
+            used, active = self.used[:n], self.active[:n]
+            last_fix, offset = self.last_fix[:n], self.offset[:n]
+            along, route = self.along[:n], self.route[:n]
+
+            watched = used & active
+            age = now - last_fix
+            stale = watched & (np.isnan(last_fix) | (age > self.stale_seconds))
+            fresh = watched & ~stale
+            off_route = fresh & (offset > Config.OFF_ROUTE_METERS)
+
+            # Bunching: sort fresh on-route buses by (route, distance along) and compare neighbours
+            candidates = np.flatnonzero(fresh & ~off_route & (route >= 0) & ~np.isnan(along))
+            ordered = candidates[np.lexsort((along[candidates], route[candidates]))]
+            leaders, followers = ordered[1:], ordered[:-1]
+            close = (route[leaders] == route[followers]) & (along[leaders] - along[followers] < self.bunching_meters)
+
+            found = {}
+            for slot in np.flatnonzero(stale):
+                found[("stale", self._bus_ids[slot])] = {
+                    "lastFixAgeSec": None if np.isnan(age[slot]) else round(float(age[slot]), 1)
+                }
+            for slot in np.flatnonzero(off_route):
+                found[("offRoute", self._bus_ids[slot])] = {"offsetMeters": round(float(offset[slot]), 1)}
+            for follower, leader in zip(followers[close], leaders[close]):
+                found[("bunching", self._bus_ids[follower])] = {
+                    "withBusId": self._bus_ids[leader],
+                    "gapMeters": round(float(along[leader] - along[follower]), 1),
+                }
+
+            alerts = {}
+            for (kind, bus_id), details in found.items():
+                previous = self.alerts.get((kind, bus_id))
+                if previous is None:
+                    self.raised[kind] += 1
+                alerts[(kind, bus_id)] = {
+                    "kind": kind,
+                    "busId": bus_id,
+                    "busNumber": self._bus_numbers[self._slots[bus_id]],
+                    "since": previous["since"] if previous else now,
+                    **details,
+                }
+            self.alerts = alerts
+            self.tick_at = now
+            self.tick_ms = round((time.perf_counter() - started) * 1000.0, 3)
+        return list(alerts.values())
+
+    def tick(self):
+        self.catch_up()
+        return self.check()
+
+    def get_alerts(self, kind=None):
+        alerts = [a for a in self.alerts.values() if kind is None or a["kind"] == kind]
+        return sorted(alerts, key=lambda a: (a["kind"], a["since"]))
+
+    def stats(self):
+        counts = {"stale": 0, "offRoute": 0, "bunching": 0}
+        for kind, _ in self.alerts:
+            counts[kind] += 1
+        return {
+            "buses": len(self._slots),
+            "bootstrapped": self.bootstrapped,
+            "tickAt": self.tick_at,
+            "tickMs": self.tick_ms,
+            "open": counts,
+            "raisedTotal": dict(self.raised),
+        }
+
+    # --- Background loop ---
+    def start(self):
+        """Bootstraps and starts the tick thread in this process (once; again after a fork)."""
+        if self.tick_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # State inherited through fork is replaced by a fresh bootstrap
+                self._allocate(len(self.used))
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="fleet-monitor", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self.bootstrap()
+        except Exception as e:
+            print(f"❌ Fleet monitor bootstrap failed: {e}")
+        while True:
+            time.sleep(self.tick_seconds)
+            try:
+                if not self.bootstrapped:
+                    self.bootstrap()
+                self.tick()
+            except Exception as e:
+                print(f"❌ Fleet monitor tick failed: {e}")
+
+
+fleet_monitor = FleetMonitor(Config.FLEET_TICK_SECONDS, Config.FLEET_STALE_SECONDS, Config.FLEET_BUNCHING_METERS)
@@ -0,0 +1,435 @@
+"""
+GTFS static feed export and import.
+
+Export maps `buses_data` and `schedules` onto a GTFS zip:
+
+- agency.txt       one agency (GTFS_AGENCY_*)
+- routes.txt       one route per bus (route_id = bus _id, route_type 3 = bus)
+- trips.txt        one trip per schedule (trip_id = schedule _id)
+- stop_times.txt   the schedule's stop_timings, in order
+- calendar.txt     one service per distinct daysActive pattern
+- frequencies.txt  schedules with frequencyMin
+- stops.txt        every stop named by a route or a schedule; stop_id is a
+                   hash of the bus's route city and the stop name, because
+                   schedules refer to stops by name (and same-named stops in
+                   different cities are different stops)
+
+The zip is written member by member into a sink that is drained after every
+batch of rows, so `export_feed()` yields it in chunks without ever holding
+more than one batch plus the per-stop and per-bus lookups in memory, however
+many stop_times there are.
+
+The importer reads the same files back in chunks: stops, routes, trips,
+calendar and frequencies are small and loaded first, then stop_times.txt is
+streamed and every finished trip becomes a schedule, written with unordered
+bulk upserts of GTFS_IMPORT_CHUNK documents. stop_times.txt must be grouped
+by trip_id (every feed this exporter writes is, as are nearly all published feeds).
+"""
+import csv
+import hashlib
+import io
+import zipfile
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from db import db
+from config import Config
+
+DAY_FIELDS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+WEEKDAYS = [day.capitalize() for day in DAY_FIELDS]
+
+COLUMNS = {
+    "agency.txt": ["agency_id", "agency_name", "agency_url", "agency_timezone"],
+    "routes.txt": ["route_id", "agency_id", "route_short_name", "route_long_name", "route_desc", "route_type"],
+    "trips.txt": ["route_id", "service_id", "trip_id"],
+    "stop_times.txt": ["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"],
+    "calendar.txt": ["service_id"] + DAY_FIELDS + ["start_date", "end_date"],
+    "frequencies.txt": ["trip_id", "start_time", "end_time", "headway_secs", "exact_times"],
+    "stops.txt": ["stop_id", "stop_name", "stop_lat", "stop_lon"],
+}
+ROUTE_TYPE_BUS = 3
+
+
+class GtfsError(Exception):
+    """A feed that cannot be imported."""
+
+
+# --- Field mapping ---
+def stop_id(name, city=None):
+    key = str(name) if city is None else f"{city}\x1f{name}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def service_id(days_active):
+    """'D' plus one flag per weekday, e.g. D1111100 for Monday-Friday; no days means every day."""
+    days = set(days_active or WEEKDAYS)
+    return "D" + "".join("1" if day in days else "0" for day in WEEKDAYS)
+
+
+def _minutes(value):
+    """'HH:MM' or 'HH:MM:SS' -> minutes, or None."""
+    try:
+        parts = str(value).split(":")
+        return int(parts[0]) * 60 + int(parts[1])
+    except (IndexError, TypeError, ValueError):
+        return None
+
+
+def _gtfs_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def stop_time_rows(trip_id, stop_timings, city=None):
+    """
+    stop_times.txt rows for one schedule ('city' is its bus's route city).
+    Our times wrap at midnight; GTFS counts on past 24:00 within a trip, so a
+    time earlier than the previous one is moved to the next day.
+    """
+    rows, last, offset = [], None, 0
+    for sequence, timing in enumerate(stop_timings or [], start=1):
+        times = []
+        for field in ("arrivalTime", "departureTime"):
+            minutes = _minutes(timing.get(field))
+            if minutes is None:
+                times.append("")
+                continue
+            minutes += offset
+            if last is not None and minutes < last:
+                offset += 24 * 60
+                minutes += 24 * 60
+            last = minutes
+            times.append(_gtfs_time(minutes))
+        rows.append([trip_id, times[0], times[1], stop_id(timing.get("stop_name"), city), sequence])
+    return rows
+
+
+def _first_departure(stop_timings):
+    for timing in stop_timings or []:
+        for field in ("departureTime", "arrivalTime"):
+            minutes = _minutes(timing.get(field))
+            if minutes is not None:
+                return minutes
+    return None
+
+
+# --- Export ---
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file the zip is written into; drain() hands out what was written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _csv_batches(rows, batch_size):
+    """Groups rows into CSV-encoded byte strings of up to batch_size rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    if count:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_feed(batch_size=None):
+    """Yields the GTFS zip in chunks, reading both collections with cursors."""
+    batch_size = batch_size or Config.GTFS_BATCH_SIZE
+    sink = _ChunkSink()
+    stop_coords = {}     # (city, stop name) -> (lat, lng), from bus routes
+    stop_names = set()   # every (city, stop name) referenced by a schedule
+    bus_cities = {}      # bus _id -> route city
+    service_ids = set()
+
+    def routes():
+        buses = db.buses_data.find({}, {"busNumber": 1, "busCategory": 1, "type": 1, "route": 1}, batch_size=batch_size)
+        for bus in buses:
+            route = bus.get("route") or {}
+            city = route.get("city")
+            for stop in route.get("stops") or []:
+                if stop.get("name") is not None and stop.get("lat") is not None and stop.get("lng") is not None:
+                    stop_coords.setdefault((city, stop["name"]), (stop["lat"], stop["lng"]))
+            bus_cities[bus["_id"]] = city
+            description = " ".join(str(v) for v in (bus.get("busCategory"), bus.get("type")) if v)
+            yield [str(bus["_id"]), "mybus", bus.get("busNumber") or "", route.get("name") or "", description, ROUTE_TYPE_BUS]
+
+    def schedules(fields):
+        return db.schedules.find({}, fields, batch_size=batch_size)
+
+    def trips():
+        for schedule in schedules({"busId": 1, "daysActive": 1}):
+            if schedule.get("busId") not in bus_cities:
+                continue
+            service = service_id(schedule.get("daysActive"))
+            service_ids.add(service)
+            yield [str(schedule["busId"]), service, str(schedule["_id"])]
+
+    def stop_times():
+        for schedule in schedules({"busId": 1, "stop_timings": 1}):
+            if schedule.get("busId") not in bus_cities:
+                continue
+            city = bus_cities[schedule["busId"]]
+            timings = schedule.get("stop_timings") or []
+            stop_names.update((city, t.get("stop_name")) for t in timings)
+            yield from stop_time_rows(str(schedule["_id"]), timings, city)
+
+    def frequencies():
+        end = _minutes(Config.GTFS_FREQUENCY_END)
+        for schedule in db.schedules.find({"frequencyMin": {"$gt": 0}}, {"busId": 1, "frequencyMin": 1, "stop_timings": 1},
+                                          batch_size=batch_size):
+            start = _first_departure(schedule.get("stop_timings"))
+            if schedule.get("busId") not in bus_cities or start is None or start >= end:
+                continue
+            yield [str(schedule["_id"]), _gtfs_time(start), _gtfs_time(end), int(schedule["frequencyMin"] * 60), 0]
+
+    def calendar():
+        start = datetime.utcnow().date()
+        end = start + timedelta(days=Config.GTFS_CALENDAR_DAYS)
+        for service in sorted(service_ids):
+            yield [service, *service[1:], start.strftime("%Y%m%d"), end.strftime("%Y%m%d")]
+
+    def stops():
+        for city, name in sorted(stop_names | set(stop_coords), key=lambda key: (str(key[0]), str(key[1]))):
+            if name is None:
+                continue
+            lat, lng = stop_coords.get((city, name), ("", ""))
+            yield [stop_id(name, city), name, lat, lng]
+
+    def agency():
+        yield ["mybus", Config.GTFS_AGENCY_NAME, Config.GTFS_AGENCY_URL, Config.GTFS_TIMEZONE]
+
+    # Order matters: routes fill bus_cities, trips fill service_ids and stop_times fill stop_names
+    members = [("agency.txt", agency), ("routes.txt", routes), ("trips.txt", trips),
+               ("stop_times.txt", stop_times), ("frequencies.txt", frequencies),
+               ("calendar.txt", calendar), ("stops.txt", stops)]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, rows in members:
+            with archive.open(name, "w", force_zip64=True) as member:
+                member.write((",".join(COLUMNS[name]) + "\n").encode("utf-8"))
+                for chunk in _csv_batches(rows(), batch_size):
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    # Whatever the last member and the central directory wrote on close
+    data = sink.drain()
+    if data:
+        yield data
+
+
+# --- Import ---
+def _read_rows(archive, name, required=True):
+    """Yields dict rows of one feed file (BOM tolerant)."""
+    try:
+        raw = archive.open(name)
+    except KeyError:
+        if required:
+            raise GtfsError(f"{name} is missing from the feed")
+        return
+    with io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as text:
+        yield from csv.DictReader(text)
+
+
+def _hhmm(value):
+    """GTFS time (may exceed 24:00) -> our 'HH:MM' wall-clock time, or None."""
+    minutes = _minutes(value)
+    if minutes is None:
+        return None
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _object_id(value):
+    """Keeps ObjectId-shaped GTFS ids, so re-importing our own export updates in place."""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def import_feed(fileobj, chunk_size=None):
+    """
+    Imports a GTFS zip (a seekable file object) into buses_data and schedules.
+    Routes become buses and trips become schedules; ids that are ObjectIds are
+    kept, so importing a feed twice updates the same documents. New buses get
+    default operational fields (GTFS has no capacity or registration). Returns
+    counts of what was written.
+    """
+    from models.sync_model import SyncModel
+    chunk_size = chunk_size or Config.GTFS_IMPORT_CHUNK
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise GtfsError("Not a zip file")
+
+    with archive:
+        stops = {}
+        for row in _read_rows(archive, "stops.txt"):
+            try:
+                lat, lng = float(row["stop_lat"]), float(row["stop_lon"])
+            except (KeyError, TypeError, ValueError):
+                lat = lng = None
+            stops[row["stop_id"]] = {"name": row.get("stop_name") or row["stop_id"], "lat": lat, "lng": lng}
+
+        routes = {}
+        for row in _read_rows(archive, "routes.txt"):
+            routes[row["route_id"]] = {
+                "_id": _object_id(row["route_id"]) or ObjectId(),
+                "busNumber": row.get("route_short_name") or row["route_id"],
+                "name": row.get("route_long_name") or row.get("route_short_name") or row["route_id"],
+                "stops": None,
+            }
+
+        services = {}
+        for row in _read_rows(archive, "calendar.txt", required=False):
+            services[row["service_id"]] = [day for day, field in zip(WEEKDAYS, DAY_FIELDS) if row.get(field) == "1"]
+
+        trips = {}
+        for row in _read_rows(archive, "trips.txt"):
+            if row["route_id"] not in routes:
+                raise GtfsError(f"Trip {row['trip_id']} refers to unknown route {row['route_id']}")
+            trips[row["trip_id"]] = (row["route_id"], row.get("service_id"))
+
+        headways = {}
+        for row in _read_rows(archive, "frequencies.txt", required=False):
+            try:
+                headways.setdefault(row["trip_id"], int(row["headway_secs"]) // 60)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        now = datetime.utcnow()
+        counts = {"stops": len(stops), "routes": 0, "trips": 0, "stopTimes": 0}
+        pending = []
+
+        def write_schedules():
+            if not pending:
+                return
+            # Stamped per chunk, next to the syncSeq reservation, for the delta sync lookback
+            stamped = datetime.utcnow()
+            seq = SyncModel.next_seq(len(pending))
+            requests = []
+            for offset, (schedule_id, fields) in enumerate(pending):
+                fields["updatedAt"] = stamped
+                fields["syncSeq"] = seq - len(pending) + 1 + offset
+                requests.append(UpdateOne({"_id": schedule_id}, {"$set": fields, "$setOnInsert": {"createdAt": now}},
+                                          upsert=True))
+            db.schedules.bulk_write(requests, ordered=False)
+            counts["trips"] += len(pending)
+            pending.clear()
+
+        def finish_trip(trip_id, rows):
+            route_id, service = trips[trip_id]
+            rows.sort(key=lambda r: r[0])
+            timings = []
+            for _, row in rows:
+                stop = stops.get(row["stop_id"]) or {"name": row["stop_id"]}
+                timings.append({
+                    "stop_id": row["stop_id"],
+                    "stop_name": stop["name"],
+                    "arrivalTime": _hhmm(row.get("arrival_time")),
+                    "departureTime": _hhmm(row.get("departure_time")),
+                })
+            route = routes[route_id]
+            if route["stops"] is None:
+                # A bus's route is the stop sequence of its first trip
+                route["stops"] = [
+                    {"name": t["stop_name"], "lat": stops.get(t["stop_id"], {}).get("lat"),
+                     "lng": stops.get(t["stop_id"], {}).get("lng"), "order": order}
+                    for order, t in enumerate(timings, start=1)
+                ]
+            pending.append((_object_id(trip_id) or ObjectId(), {
+                "busId": route["_id"],
+                "daysActive": services.get(service) or list(WEEKDAYS),
+                "stop_timings": timings,
+                "frequencyMin": headways.get(trip_id),
+            }))
+            if len(pending) >= chunk_size:
+                write_schedules()
+
+        current, rows, finished = None, [], set()
+        for row in _read_rows(archive, "stop_times.txt"):
+            trip_id = row["trip_id"]
+            if trip_id != current:
+                if current is not None:
+                    finish_trip(current, rows)
+                    finished.add(current)
+                if trip_id in finished:
+                    raise GtfsError("stop_times.txt must be grouped by trip_id")
+                if trip_id not in trips:
+                    raise GtfsError(f"stop_times.txt refers to unknown trip {trip_id}")
+                current, rows = trip_id, []
+            try:
+                rows.append((int(row["stop_sequence"]), row))
+            except (KeyError, TypeError, ValueError):
+                raise GtfsError(f"Bad stop_sequence in trip {trip_id}")
+            counts["stopTimes"] += 1
+        if current is not None:
+            finish_trip(current, rows)
+        write_schedules()
+
+    write_buses(routes.values(), now, chunk_size)
+    counts["routes"] = len(routes)
+
+    # Bulk writes bypass the models, so refresh what they normally keep in step
+    from models.stats_model import StatsModel
+    from utils.cache import read_cache
+    from utils.timetable_snapshot import timetable
+    read_cache.clear()
+    timetable.request_rebuild()
+    StatsModel.reconcile()
+    return counts
+
+
+def write_buses(routes, now, chunk_size):
+    """Upserts one bus per imported route, keeping operational fields of buses that already exist."""
+    from models.sync_model import SyncModel
+    from utils.route_geometry import build_geometry
+
+    routes = list(routes)
+    for start in range(0, len(routes), chunk_size):
+        chunk = routes[start:start + chunk_size]
+        stamped = datetime.utcnow()
+        seq = SyncModel.next_seq(len(chunk))
+        requests = []
+        for offset, route in enumerate(chunk):
+            fields = {
+                "busNumber": route["busNumber"],
+                "route.name": route["name"],
+                "updatedAt": stamped,
+                "syncSeq": seq - len(chunk) + 1 + offset,
+            }
+            defaults = {
+                "busCategory": "CITY",
+                "type": "NON_AC",
+                "capacity": Config.GTFS_IMPORT_CAPACITY,
+                "registrationNo": "",
+                "gpsDeviceId": "",
+                "currentLocation": {},
+                "status": "ACTIVE",
+                "route.city": None,
+                "createdAt": now,
+            }
+            # A route without trips in this feed keeps the stops an existing bus already has
+            route_fields = fields if route["stops"] is not None else defaults
+            route_fields["route.stops"] = route["stops"] or []
+            route_fields["routeGeometry"] = build_geometry({"stops": route["stops"] or []})
+            requests.append(UpdateOne({"_id": route["_id"]}, {"$set": fields, "$setOnInsert": defaults}, upsert=True))
+        db.buses_data.bulk_write(requests, ordered=False)
@@ -0,0 +1,315 @@
+"""
+On-demand request profiling.
+
+A request is profiled when an admin sends the `X-Profile: 1` header, or when it
+falls into the random sample configured by PROFILE_SAMPLE_RATE. While a profiled
+request runs, a sampler thread records its Python call stack every
+PROFILE_INTERVAL_MS and a pymongo command listener records each Mongo command
+as a span. Finished profiles are stored in a capped Mongo collection shared by all
+workers and served by the admin endpoints in `routes/ops_routes.py` as
+speedscope JSON or collapsed stacks.
+
+When profiling is off the only per-request cost is one header lookup, and the
+Mongo listener only does a thread-local attribute read per command.
+"""
+import random
+import sys
+import threading
+import time
+import uuid
+from flask import request, g
+from pymongo import monitoring
+from config import Config
+from utils.jwt_utils import verify_token
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+_active = threading.local()
+
+
+class RequestProfile:
+    """Stack samples and Mongo spans collected for a single request."""
+
+    def __init__(self, method, path, reason):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.samples = {}      # tuple of frames (root → leaf) → sample count
+        self.mongo_spans = []  # {"command", "collection", "startMs", "durationMs", "ok"}
+        self._pending = {}     # pymongo request_id → start offset in ms
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000.0
+
+    # --- Output formats ---
+    def to_collapsed(self):
+        """Brendan Gregg collapsed-stack format, one `a;b;c weight` line per stack (weights in ms)."""
+        lines = []
+        interval = Config.PROFILE_INTERVAL_MS
+        for stack, count in self.samples.items():
+            lines.append(";".join(_frame_label(frame) for frame in stack) + f" {count * interval}")
+        for span in self.mongo_spans:
+            # Mongo time shows up as a synthetic leaf under the request
+            label = f"mongo:{span['command']}:{span['collection'] or '-'}"
+            lines.append(f"{self.method} {self.path};{label} {max(1, int(span['durationMs']))}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self):
+        """speedscope file format: a sampled CPU profile plus an evented Mongo timeline."""
+        frames, index = [], {}
+
+        def frame_id(key):
+            if key not in index:
+                index[key] = len(frames)
+                filename, name, line = key
+                frames.append({"name": name, "file": filename, "line": line})
+            return index[key]
+
+        samples, weights = [], []
+        interval = Config.PROFILE_INTERVAL_MS
+        for stack, count in self.samples.items():
+            samples.append([frame_id(frame) for frame in stack])
+            weights.append(count * interval)
+
+        events = []
+        for span in sorted(self.mongo_spans, key=lambda s: s["startMs"]):
+            fid = frame_id(("mongo", f"{span['command']} {span['collection'] or ''}".strip(), 0))
+            events.append({"type": "O", "frame": fid, "at": span["startMs"]})
+            events.append({"type": "C", "frame": fid, "at": span["startMs"] + span["durationMs"]})
+
+        end = self.duration_ms or self.elapsed_ms()
+        name = f"{self.method} {self.path}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "mybus-profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {"type": "sampled", "name": f"{name} (python)", "unit": "milliseconds",
+                 "startValue": 0, "endValue": end, "samples": samples, "weights": weights},
+                {"type": "evented", "name": f"{name} (mongo)", "unit": "milliseconds",
+                 "startValue": 0, "endValue": end, "events": events},
+            ],
+        }
+
+    # --- Storage ---
+    def to_document(self):
+        return {
+            "_id": self.id,
+            "summary": self.summary(),
+            "samples": [[[list(frame) for frame in stack], count] for stack, count in self.samples.items()],
+            "mongoSpans": self.mongo_spans,
+        }
+
+    @classmethod
+    def from_document(cls, document):
+        summary = document["summary"]
+        profile = cls(summary["method"], summary["path"], summary["reason"])
+        profile.id = document["_id"]
+        profile.started_at = summary["startedAt"]
+        profile.duration_ms = summary["durationMs"]
+        profile.status = summary["status"]
+        profile.samples = {tuple(tuple(frame) for frame in stack): count for stack, count in document["samples"]}
+        profile.mongo_spans = document["mongoSpans"]
+        return profile
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status": self.status,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "samples": sum(self.samples.values()),
+            "mongoCommands": len(self.mongo_spans),
+            "mongoMs": round(sum(s["durationMs"] for s in self.mongo_spans), 3),
+        }
+
+
+def _frame_label(frame):
+    filename, name, line = frame
+    return f"{name} ({filename}:{line})"
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack until stopped."""
+
+    def __init__(self, profile, thread_id):
+        super().__init__(daemon=True, name=f"profiler-{profile.id[:8]}")
+        self.profile = profile
+        self.thread_id = thread_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = Config.PROFILE_INTERVAL_MS / 1000.0
+        samples = self.profile.samples
+        while not self.stopped.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))
+                samples[key] = samples.get(key, 0) + 1
+
+
+class ProfileStore:
+    """
+    Finished profiles, shared by every worker through a capped Mongo
+    collection (newest PROFILE_MAX_STORED kept), so a profile recorded by one
+    worker can be fetched through any other.
+    """
+
+    COLLECTION = "request_profiles"
+
+    def __init__(self, max_items, max_bytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._ensured = False
+        self._capped = True
+
+    @property
+    def collection(self):
+        from db import db  # db imports this module for the command listener
+        return db[self.COLLECTION]
+
+    def ensure_collection(self):
+        """Creates the capped collection; run once at startup, before any profile is stored."""
+        from db import db
+        if self.COLLECTION not in db.list_collection_names():
+            try:
+                db.create_collection(self.COLLECTION, capped=True, size=self.max_bytes, max=self.max_items)
+            except NotImplementedError:
+                # The mongomock stand-in has no capped collections; add() trims instead
+                self._capped = False
+            except Exception:
+                pass  # Another process created it first
+        self._ensured = True
+
+    def add(self, profile):
+        document = profile.to_document()
+        try:
+            if not self._ensured:
+                # An insert into a missing collection would create an uncapped one
+                self.ensure_collection()
+            self.collection.insert_one(document)
+            if not self._capped:
+                stale = self.collection.find({}, {"_id": 1}).sort("summary.startedAt", -1).skip(self.max_items)
+                self.collection.delete_many({"_id": {"$in": [d["_id"] for d in stale]}})
+        except Exception as e:
+            # e.g. a huge profile over the 16 MB document limit; the request itself already succeeded
+            print(f"❌ Could not store profile {profile.id}: {e}")
+
+    def get(self, profile_id):
+        document = self.collection.find_one({"_id": profile_id})
+        return RequestProfile.from_document(document) if document else None
+
+    def list(self):
+        documents = self.collection.find({}, {"summary": 1}).sort("summary.startedAt", -1).limit(self.max_items)
+        return [document["summary"] for document in documents]
+
+    def clear(self):
+        # Capped collections do not support deletes on every server version; recreate instead
+        self.collection.drop()
+        self.ensure_collection()
+
+
+profile_store = ProfileStore(Config.PROFILE_MAX_STORED, Config.PROFILE_STORE_MAX_BYTES)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records Mongo commands issued by a thread that is currently being profiled."""
+
+    def started(self, event):
+        profile = getattr(_active, "profile", None)
+        if profile is not None:
+            profile._pending[event.request_id] = (
+                profile.elapsed_ms(), event.command_name, event.command.get(event.command_name)
+            )
+
+    def _finish(self, event, ok):
+        profile = getattr(_active, "profile", None)
+        if profile is None:
+            return
+        pending = profile._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        start_ms, command, collection = pending
+        profile.mongo_spans.append({
+            "command": command,
+            "collection": collection if isinstance(collection, str) else None,
+            "startMs": round(start_ms, 3),
+            "durationMs": event.duration_micros / 1000.0,
+            "ok": ok,
+        })
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+def _profile_reason():
+    """Decides whether the current request should be profiled, and why."""
+    if request.headers.get(PROFILE_HEADER):
+        token = request.headers.get("Authorization", "")
+        if token.startswith("Bearer "):
+            token = token.split(" ")[1]
+        decoded = verify_token(token) if token else None
+        if decoded and decoded.get("role") == "ADMIN":
+            return "header"
+        return None
+    if Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def init_profiler(app):
+    """Registers the profiling request hooks on a Flask app."""
+
+    @app.before_request
+    def _start_profile():
+        reason = _profile_reason()
+        if reason is None:
+            return
+        profile = RequestProfile(request.method, request.full_path.rstrip("?"), reason)
+        sampler = _StackSampler(profile, threading.get_ident())
+        g._profile = profile
+        g._profile_sampler = sampler
+        _active.profile = profile
+        sampler.start()
+
+    @app.after_request
+    def _tag_response(response):
+        profile = g.get("_profile")
+        if profile is not None:
+            profile.status = response.status_code
+            response.headers[PROFILE_ID_HEADER] = profile.id
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return
+        sampler = g.pop("_profile_sampler")
+        sampler.stopped.set()
+        sampler.join(timeout=1.0)
+        _active.profile = None
+        profile.duration_ms = profile.elapsed_ms()
+        profile._pending.clear()
+        profile_store.add(profile)
@@ -0,0 +1,117 @@
+"""
+Route geometry and GPS snapping.
+
+A bus's `route.stops` (ordered by `order`) is turned once, on write, into a
+polyline with cumulative distances and stored as `routeGeometry`. Each GPS fix
+is then projected onto every segment at once with numpy to find the nearest
+point on the route, giving the distance travelled along it, the next stop and
+whether the bus is off route. Coordinates are projected onto a local
+equirectangular plane around the route, which is accurate to well under a
+metre over city-sized routes.
+"""
+import math
+from datetime import datetime
+import numpy as np
+from config import Config
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def _ordered_stops(stops):
+    """Returns [(lat, lng, name)] in route order, or None if any stop lacks coordinates."""
+    ordered = sorted(stops, key=lambda s: s.get("order", 0))
+    result = []
+    for stop in ordered:
+        try:
+            result.append((float(stop["lat"]), float(stop["lng"]), stop.get("name")))
+        except (KeyError, TypeError, ValueError):
+            return None
+    return result
+
+
+def _project(lat, lng, origin_lat, origin_lng):
+    """Degrees → metres on a plane tangent at the origin (works on scalars and arrays)."""
+    k = math.pi / 180.0
+    x = (np.asarray(lng) - origin_lng) * k * EARTH_RADIUS_M * math.cos(origin_lat * k)
+    y = (np.asarray(lat) - origin_lat) * k * EARTH_RADIUS_M
+    return x, y
+
+
+def build_geometry(route):
+    """
+    Returns the `routeGeometry` document for a route, or None when the route
+    has fewer than two stops with coordinates.
+    """
+    stops = _ordered_stops((route or {}).get("stops") or [])
+    if not stops or len(stops) < 2:
+        return None
+
+    lats = np.array([s[0] for s in stops])
+    lngs = np.array([s[1] for s in stops])
+    origin = (float(lats.mean()), float(lngs.mean()))
+    x, y = _project(lats, lngs, *origin)
+    seg_len = np.hypot(np.diff(x), np.diff(y))
+    cum = np.concatenate(([0.0], np.cumsum(seg_len)))
+    return {
+        "origin": [origin[0], origin[1]],
+        "points": [[lat, lng] for lat, lng, _ in stops],
+        "stopNames": [name for _, _, name in stops],
+        "cumDist": [round(float(d), 2) for d in cum],  # one entry per stop, in metres
+        "length": round(float(cum[-1]), 2),
+    }
+
+
+def snap_to_route(geometry, lat, lng):
+    """
+    Projects a fix onto the route polyline. Returns the progress fields stored
+    on `currentLocation`: distanceAlongRoute and offsetMeters in metres,
+    nextStopIndex/nextStopName (index into the stops in route order, None past
+    the last stop) and offRoute when the fix is more than OFF_ROUTE_METERS
+    from the route.
+    """
+    points = np.asarray(geometry["points"], dtype=float)
+    cum = np.asarray(geometry["cumDist"], dtype=float)
+    x, y = _project(points[:, 0], points[:, 1], *geometry["origin"])
+    px, py = _project(lat, lng, *geometry["origin"])
+
+    # Nearest point on each segment A→B, all segments at once
+    ax, ay = x[:-1], y[:-1]
+    dx, dy = np.diff(x), np.diff(y)
+    seg_sq = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = ((px - ax) * dx + (py - ay) * dy) / seg_sq
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    dist = np.hypot(ax + t * dx - px, ay + t * dy - py)
+
+    i = int(np.argmin(dist))
+    along = float(cum[i] + t[i] * (cum[i + 1] - cum[i]))
+    next_stop = int(np.searchsorted(cum, along, side="right"))
+    if next_stop >= len(cum):
+        next_stop = None
+    offset = float(dist[i])
+    names = geometry.get("stopNames") or []
+    return {
+        "distanceAlongRoute": round(along, 2),
+        "routeLength": geometry["length"],
+        "offsetMeters": round(offset, 2),
+        "nextStopIndex": next_stop,
+        "nextStopName": names[next_stop] if next_stop is not None and next_stop < len(names) else None,
+        "offRoute": offset > Config.OFF_ROUTE_METERS,
+    }
+
+
+def locate(location, geometry):
+    """
+    Returns the `currentLocation` document for a fix: the fix as given plus the
+    server receive time ('recordedAt') and, when the bus has route geometry,
+    its progress.
+    """
+    location = dict(location or {})
+    location["recordedAt"] = datetime.utcnow()
+    try:
+        lat, lng = float(location["lat"]), float(location["lng"])
+    except (KeyError, TypeError, ValueError):
+        return location
+    if geometry:
+        location.update(snap_to_route(geometry, lat, lng))
+    return location
@@ -0,0 +1,406 @@
+"""
+Compiled, memory-mapped timetable snapshot shared by all worker processes.
+
+The compiler reads every bus route and schedule once and writes a compact,
+versioned binary file: stop and city names are interned into one sorted string
+table, routes and a stop → bus inverted index are packed into flat integer
+arrays, and each bus's schedules (stop_timings included) are stored as the
+ready-to-send JSON body of `GET /schedules?busId=`. Workers mmap the file read-only and answer
+city/stop/search lookups straight from those pages, so the data lives once in
+the OS page cache however many workers there are.
+
+Files are named `timetable-<version>-<ms>.bin`, where the version is the
+delta-sync sequence number at compile time. A `CURRENT` pointer file is swapped with
+os.replace once the new file is complete; readers notice the change within
+TIMETABLE_CHECK_SECONDS and switch over, while requests already running keep
+the mapping they started with.
+
+A route or schedule write touches a `REBUILD` marker next to CURRENT and arms a debounced
+recompile in its own process. The marker is removed only by a compile that
+started after it was last touched, so when the writing worker exits before its
+timer fires, any other worker that finds the marker overdue compiles instead.
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bson import ObjectId
+from config import Config
+from db import db
+from models.sync_model import SyncModel
+from utils.custom_json_encoder import CustomJSONEncoder
+from utils.json_encoder import serialize_doc
+
+MAGIC = b"MBTT"
+FORMAT_VERSION = 3
+NONE = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<4sHHBxxxQd")          # magic, format, sections, little-endian, version, created
+_SECTION = struct.Struct("<16s1sxxxxxxxQQ")      # name, typecode, offset, count
+
+
+# ============================================
+# == COMPILER ==
+# ============================================
+
+def schedules_body(schedules):
+    """The JSON body GET /schedules?busId= sends for these schedule documents."""
+    docs = []
+    for schedule in schedules:
+        schedule = dict(schedule, _id=str(schedule["_id"]))
+        docs.append(serialize_doc(schedule))
+    return json.dumps(docs, cls=CustomJSONEncoder, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _collect():
+    """Reads routes with a narrow projection, and every schedule grouped by bus (in natural order)."""
+    buses = list(db.buses_data.find({}, {"route.city": 1, "route.stops.name": 1}))
+    schedules = {}
+    for schedule in db.schedules.find({}):
+        schedules.setdefault(schedule.get("busId"), []).append(schedule)
+    return buses, schedules
+
+
+def build_sections(buses, schedules):
+    """
+    Packs bus routes into named typed arrays and each bus's schedules into one
+    JSON body. Buses are sorted by ObjectId bytes; every '*_off' array holds
+    n+1 offsets into the array that follows it (strings, route stops,
+    postings, schedule bodies). Stops keep their stored list order, as in the
+    MongoDB search path.
+    """
+    buses = sorted(buses, key=lambda b: ObjectId(b["_id"]).binary)
+
+    routes = []
+    names = set()
+    for bus in buses:
+        route = bus.get("route") or {}
+        stop_names = [s["name"] for s in route.get("stops") or [] if s.get("name")]
+        routes.append((route.get("city"), stop_names))
+        names.update(stop_names)
+        if route.get("city"):
+            names.add(route["city"])
+
+    strings = sorted(names, key=lambda s: s.encode("utf-8"))
+    string_index = {s: i for i, s in enumerate(strings)}
+    str_off, str_data = array("I", [0]), bytearray()
+    for s in strings:
+        str_data += s.encode("utf-8")
+        str_off.append(len(str_data))
+
+    bus_ids = bytearray()
+    bus_city = array("I")
+    bus_stop_off, bus_stops = array("I", [0]), array("I")
+    postings = {}
+    cities, stop_set = set(), set()
+    for bus_idx, (bus, (city, stop_names)) in enumerate(zip(buses, routes)):
+        bus_ids += ObjectId(bus["_id"]).binary
+        bus_city.append(string_index[city] if city else NONE)
+        if city:
+            cities.add(string_index[city])
+        seen = set()
+        for pos, name in enumerate(stop_names):
+            sid = string_index[name]
+            bus_stops.append(sid)
+            stop_set.add(sid)
+            if sid not in seen:  # first occurrence only, like list.index()
+                seen.add(sid)
+                postings.setdefault(sid, []).append((bus_idx, pos))
+        bus_stop_off.append(len(bus_stops))
+
+    post_off, post_bus, post_pos = array("I", [0]), array("I"), array("I")
+    for sid in range(len(strings)):
+        for bus_idx, pos in postings.get(sid, []):
+            post_bus.append(bus_idx)
+            post_pos.append(pos)
+        post_off.append(len(post_bus))
+
+    sched_json_off, sched_json = array("Q", [0]), bytearray()
+    for bus in buses:
+        sched_json += schedules_body(schedules.get(ObjectId(bus["_id"]), []))
+        sched_json_off.append(len(sched_json))
+
+    return {
+        "str_off": str_off, "str_data": array("B", bytes(str_data)),
+        "bus_ids": array("B", bytes(bus_ids)), "bus_city": bus_city,
+        "bus_stop_off": bus_stop_off, "bus_stops": bus_stops,
+        "post_off": post_off, "post_bus": post_bus, "post_pos": post_pos,
+        "city_list": array("I", sorted(cities)), "stop_list": array("I", sorted(stop_set)),
+        "sched_json_off": sched_json_off, "sched_json": array("B", bytes(sched_json)),
+    }
+
+
+def write_snapshot(path, sections, version):
+    """Writes sections to 'path' (header, section table, 8-byte aligned arrays)."""
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table, layout = [], []
+    for name, values in sections.items():
+        offset = (offset + 7) & ~7
+        table.append(_SECTION.pack(name.encode(), values.typecode.encode(), offset, len(values)))
+        layout.append((offset, values))
+        offset += len(values) * values.itemsize
+
+    with open(path, "wb") as fh:
+        fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), sys.byteorder == "little", version, time.time()))
+        fh.write(b"".join(table))
+        for start, values in layout:
+            fh.write(b"\0" * (start - fh.tell()))
+            values.tofile(fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def _marker_mtime(marker):
+    try:
+        return os.stat(marker).st_mtime_ns
+    except OSError:
+        return None
+
+
+def compile_snapshot(directory=None, keep=3, only_if_pending=False):
+    """
+    Builds a new snapshot from the database and points CURRENT at it.
+    Safe to call from several processes at once. Returns the new file path,
+    or None when 'only_if_pending' is set and no rebuild is pending any more.
+    """
+    directory = directory or Config.TIMETABLE_DIR
+    os.makedirs(directory, exist_ok=True)
+    marker = os.path.join(directory, "REBUILD")
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # one compiler at a time across workers
+        requested = _marker_mtime(marker)
+        if only_if_pending and requested is None:
+            return None  # another process compiled while we waited for the lock
+        version = SyncModel.current_seq()
+        buses, schedules = _collect()
+        name = f"timetable-{version}-{int(time.time() * 1000)}.bin"
+        path = os.path.join(directory, name)
+        write_snapshot(path + ".tmp", build_sections(buses, schedules), version)
+        os.replace(path + ".tmp", path)
+
+        pointer = os.path.join(directory, "CURRENT")
+        with open(pointer + ".tmp", "w") as fh:
+            fh.write(name)
+        os.replace(pointer + ".tmp", pointer)
+
+        # A write that touched the marker after we read the data still needs a rebuild
+        if requested is not None and _marker_mtime(marker) == requested:
+            try:
+                os.remove(marker)
+            except OSError:
+                pass
+
+        # Old files can go: processes that still map them keep their pages
+        others = [f for f in os.listdir(directory)
+                  if f.startswith("timetable-") and f.endswith(".bin") and f != name]
+        others.sort(key=lambda f: os.path.getmtime(os.path.join(directory, f)))
+        for stale in others[:max(0, len(others) - (keep - 1))]:
+            try:
+                os.remove(os.path.join(directory, stale))
+            except OSError:
+                pass
+        return path
+
+
+# ============================================
+# == READER ==
+# ============================================
+
+class TimetableSnapshot:
+    """Read-only view over one mmapped snapshot file; every array is a zero-copy memoryview."""
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, count, little, self.version, self.created = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a timetable snapshot")
+        if bool(little) != (sys.byteorder == "little"):
+            raise ValueError(f"{path} was written on a machine with different byte order")
+        self.path = path
+        view = memoryview(self._map)
+        self.arrays = {}
+        for i in range(count):
+            name, typecode, offset, length = _SECTION.unpack_from(self._map, _HEADER.size + i * _SECTION.size)
+            itemsize = array(typecode.decode()).itemsize
+            self.arrays[name.rstrip(b"\0").decode()] = view[offset:offset + length * itemsize].cast(typecode.decode())
+        for name, values in self.arrays.items():
+            setattr(self, "_" + name, values)
+        self.bus_count = len(self._bus_city)
+
+    # --- Strings ---
+    def string(self, index):
+        return bytes(self._str_data[self._str_off[index]:self._str_off[index + 1]]).decode("utf-8")
+
+    def find_string(self, value):
+        """Binary search in the sorted string table; returns the index or None."""
+        target = value.encode("utf-8")
+        lo, hi = 0, len(self._str_off) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = bytes(self._str_data[self._str_off[mid]:self._str_off[mid + 1]])
+            if current < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._str_off) - 1 and self.string(lo) == value:
+            return lo
+        return None
+
+    # --- Buses ---
+    def bus_id(self, index):
+        return bytes(self._bus_ids[index * 12:(index + 1) * 12]).hex()
+
+    def find_bus(self, bus_id):
+        """Index of a bus in the snapshot (binary search over the sorted ids), or None."""
+        try:
+            target = ObjectId(bus_id).binary
+        except Exception:
+            return None
+        lo, hi = 0, self.bus_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._bus_ids[mid * 12:(mid + 1) * 12]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.bus_count and bytes(self._bus_ids[lo * 12:(lo + 1) * 12]) == target:
+            return lo
+        return None
+
+    def cities(self):
+        return [self.string(i) for i in self._city_list]
+
+    def stops(self):
+        return [self.string(i) for i in self._stop_list]
+
+    def search(self, source, destination):
+        """Ids of buses that stop at 'source' and later at 'destination'."""
+        src, dst = self.find_string(source), self.find_string(destination)
+        if src is None or dst is None:
+            return []
+        i, i_end = self._post_off[src], self._post_off[src + 1]
+        j, j_end = self._post_off[dst], self._post_off[dst + 1]
+        post_bus, post_pos = self._post_bus, self._post_pos
+        matches = []
+        while i < i_end and j < j_end:  # both posting lists are sorted by bus
+            a, b = post_bus[i], post_bus[j]
+            if a == b:
+                if post_pos[i] < post_pos[j]:
+                    matches.append(self.bus_id(a))
+                i += 1
+                j += 1
+            elif a < b:
+                i += 1
+            else:
+                j += 1
+        return matches
+
+    # --- Schedules ---
+    def schedules_json(self, bus_id):
+        """The compiled GET /schedules?busId= body for a bus (bytes), or None when the bus is not in the snapshot."""
+        bus = self.find_bus(bus_id)
+        if bus is None:
+            return None
+        return bytes(self._sched_json[self._sched_json_off[bus]:self._sched_json_off[bus + 1]])
+
+
+class TimetableManager:
+    """
+    Per-process handle on the current snapshot. Re-reads the CURRENT pointer at
+    most every TIMETABLE_CHECK_SECONDS and swaps to a new file when it changes;
+    route and schedule writes schedule a debounced recompile.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._current_name = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuild_timer = None
+
+    @property
+    def enabled(self):
+        return bool(Config.TIMETABLE_DIR)
+
+    def get(self):
+        """Returns the current TimetableSnapshot, or None when disabled or not compiled yet."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= Config.TIMETABLE_CHECK_SECONDS:
+            with self._lock:
+                if now - self._checked_at >= Config.TIMETABLE_CHECK_SECONDS:
+                    self._checked_at = now
+                    self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        self._adopt_overdue_rebuild()
+        try:
+            with open(os.path.join(Config.TIMETABLE_DIR, "CURRENT")) as fh:
+                name = fh.read().strip()
+        except OSError:
+            return
+        if name and name != self._current_name:
+            try:
+                self._snapshot = TimetableSnapshot(os.path.join(Config.TIMETABLE_DIR, name))
+                self._current_name = name
+            except (OSError, ValueError) as e:
+                print(f"❌ Could not open timetable snapshot {name}: {e}")
+
+    def reset(self):
+        """Drops the mapping and any pending rebuild (after fork)."""
+        with self._lock:
+            self._snapshot = None
+            self._current_name = None
+            self._checked_at = 0.0
+            self._rebuild_timer = None
+
+    def request_rebuild(self):
+        """Recompiles TIMETABLE_REBUILD_DELAY seconds after the last route or schedule write."""
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(Config.TIMETABLE_DIR, exist_ok=True)
+            with open(os.path.join(Config.TIMETABLE_DIR, "REBUILD"), "a"):
+                pass
+            os.utime(os.path.join(Config.TIMETABLE_DIR, "REBUILD"))
+        except OSError as e:
+            print(f"❌ Could not mark timetable snapshot for rebuild: {e}")
+        with self._lock:
+            self._arm(Config.TIMETABLE_REBUILD_DELAY)
+
+    def _arm(self, delay):
+        # Caller holds self._lock
+        if self._rebuild_timer is not None:
+            self._rebuild_timer.cancel()
+        self._rebuild_timer = threading.Timer(delay, self._rebuild)
+        self._rebuild_timer.daemon = True
+        self._rebuild_timer.start()
+
+    def _adopt_overdue_rebuild(self):
+        """Compiles here when another process requested a rebuild and did not finish it in time."""
+        if self._rebuild_timer is not None and self._rebuild_timer.is_alive():
+            return
+        try:
+            age = time.time() - os.stat(os.path.join(Config.TIMETABLE_DIR, "REBUILD")).st_mtime
+        except OSError:
+            return
+        if age > 2 * Config.TIMETABLE_REBUILD_DELAY:
+            self._arm(0)
+
+    def _rebuild(self):
+        try:
+            compile_snapshot(only_if_pending=True)
+            self._checked_at = 0.0  # pick the new file up on the next lookup
+        except Exception as e:
+            print(f"❌ Timetable snapshot rebuild failed: {e}")
+
+
+timetable = TimetableManager()
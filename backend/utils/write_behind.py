@@ -0,0 +1,180 @@
+"""
+Write-behind buffering for small, high-frequency per-document updates.
+
+Updates are merged in memory per document id ($set: last value wins, $inc:
+summed, $max: largest kept) and written as one unordered bulk_write when the
+flush interval elapses, when the number of pending documents reaches the size
+threshold, or at interpreter shutdown. Callers never wait on the database.
+
+A document whose update fails is put back and retried with the next flush, at
+most `max_retries` times; updates rejected with an error that cannot succeed
+on retry (see PERMANENT_ERROR_CODES) are dropped and logged at once.
+"""
+import atexit
+import os
+import threading
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Server write errors caused by the update itself: retrying cannot succeed
+PERMANENT_ERROR_CODES = {
+    2,      # BadValue
+    9,      # FailedToParse
+    14,     # TypeMismatch
+    28,     # PathNotViable
+    52,     # DollarPrefixedFieldName
+    66,     # ImmutableField
+    11000,  # DuplicateKey
+    17419,  # document too large
+}
+
+def _merge(target, ops, incoming_wins=True):
+    """Folds one update document into another."""
+    for op, fields in ops.items():
+        merged = target.setdefault(op, {})
+        for field, value in fields.items():
+            if field not in merged:
+                merged[field] = value
+            elif op == "$inc":
+                merged[field] += value
+            elif op == "$max":
+                merged[field] = max(merged[field], value)
+            elif incoming_wins:
+                merged[field] = value
+
+
+class WriteBehindBuffer:
+    def __init__(self, collection, flush_interval, max_pending, name="write-behind", max_retries=5):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.name = name
+        self._pending = {}
+        self._attempts = {}  # doc id -> failed flushes so far
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def update(self, doc_id, set_fields=None, inc_fields=None, max_fields=None):
+        """Queues an update for one document; returns immediately."""
+        ops = {}
+        if set_fields:
+            ops["$set"] = set_fields
+        if inc_fields:
+            ops["$inc"] = inc_fields
+        if max_fields:
+            ops["$max"] = max_fields
+        if not ops:
+            return
+        self._ensure_started()
+        with self._lock:
+            _merge(self._pending.setdefault(doc_id, {}), ops)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Writes all pending updates in one unordered bulk_write. Returns the number of documents."""
+        with self._flush_lock:
+            with self._lock:
+                if self._pid not in (None, os.getpid()):
+                    # Forked copy of another process's queue: not ours to write
+                    self._pending = {}
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            items = list(batch.items())
+            try:
+                self.collection.bulk_write(
+                    [UpdateOne({"_id": doc_id}, ops) for doc_id, ops in items],
+                    ordered=False
+                )
+                self.flushes += 1
+                self.written += len(items)
+                self._forget_attempts(items)
+                return len(items)
+            except BulkWriteError as e:
+                # Unordered: everything except the reported errors was applied
+                write_errors = e.details.get("writeErrors", [])
+                failed = {error["index"] for error in write_errors}
+                permanent = {error["index"] for error in write_errors if error.get("code") in PERMANENT_ERROR_CODES}
+                self._forget_attempts([item for i, item in enumerate(items) if i not in failed])
+                self._drop([items[i] for i in permanent], e)
+                self._requeue([items[i] for i in failed - permanent], e)
+                self.written += len(items) - len(failed)
+                return len(items) - len(failed)
+            except Exception as e:
+                self._requeue(items, e)
+                return 0
+
+    def _forget_attempts(self, items):
+        if self._attempts:
+            with self._lock:
+                for doc_id, _ in items:
+                    self._attempts.pop(doc_id, None)
+
+    def _drop(self, items, error):
+        if not items:
+            return
+        self.dropped += len(items)
+        with self._lock:
+            for doc_id, _ in items:
+                self._attempts.pop(doc_id, None)
+        print(f"❌ {self.name} dropped update(s) for {len(items)} document(s) "
+              f"({', '.join(str(doc_id) for doc_id, _ in items[:5])}): {error}")
+
+    def _requeue(self, items, error):
+        if not items:
+            return
+        self.errors += 1
+        retry, give_up = [], []
+        with self._lock:
+            for doc_id, ops in items:
+                attempts = self._attempts.get(doc_id, 0) + 1
+                if attempts > self.max_retries:
+                    give_up.append((doc_id, ops))
+                    continue
+                self._attempts[doc_id] = attempts
+                retry.append((doc_id, ops))
+                # Put the batch back underneath anything queued since the swap
+                _merge(self._pending.setdefault(doc_id, {}), ops, incoming_wins=False)
+        if retry:
+            print(f"❌ {self.name} flush failed for {len(retry)} document(s), will retry: {error}")
+        self._drop(give_up, f"still failing after {self.max_retries} retries: {error}")
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"name": self.name, "pending": pending, "flushes": self.flushes,
+                "written": self.written, "errors": self.errors, "dropped": self.dropped,
+                "maxRetries": self.max_retries, "flushInterval": self.flush_interval, "maxPending": self.max_pending}
+
+    # --- Background flusher ---
+    def _ensure_started(self):
+        # Started lazily, and again after a fork: threads do not survive fork,
+        # and updates queued in the parent are the parent's to write.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self._pending = {}
+                self._attempts = {}
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()